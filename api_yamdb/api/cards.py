@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from reviews.catalog import get_snapshot
+
+# Номер после title-card меняется вместе с набором полей карточки.
+CARD_KEY = 'title-card:2:{version}:{pk}:{changed}:{reviews_changed}'
+
+
+class RawJSON(str):
+    """Готовый JSON-текст ответа."""
+
+
+class CardJSONRenderer(JSONRenderer):
+    """JSONRenderer, отдающий RawJSON без повторной сериализации."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, RawJSON):
+            return data.encode()
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+def card_key(version, pk, changed_at, reviews_changed_at):
+    """Ключ карточки меняется вместе с ее содержимым.
+
+    changed_at обновляется при сохранении произведения и изменении его
+    жанров, reviews_changed_at - при изменении отзывов (рейтинг), версия
+    справочников - при изменении категорий и жанров. Поэтому карточки не
+    нужно удалять из кэша, устаревшие вытесняются по TITLE_CARD_TTL.
+    """
+    return CARD_KEY.format(
+        version=version,
+        pk=pk,
+        changed=changed_at.isoformat() if changed_at else '',
+        reviews_changed=(
+            reviews_changed_at.isoformat() if reviews_changed_at else ''
+        )
+    )
+
+
+def render_json(data):
+    return JSONRenderer().render(data).decode()
+
+
+def get_cards(rows, load):
+    """JSON-карточки произведений в порядке rows.
+
+    rows - кортежи (pk, changed_at, reviews_changed_at), load(pks)
+    возвращает сериализованные данные недостающих произведений в виде
+    {pk: data}. Карточки берутся из кэша одним get_many, недостающие
+    рендерятся и сохраняются одним set_many.
+    """
+    version = get_snapshot().version
+    keys = {row[0]: card_key(version, *row) for row in rows}
+    cards = cache.get_many(keys.values())
+    missing = [pk for pk, key in keys.items() if key not in cards]
+    if missing:
+        rendered = {
+            keys[pk]: render_json(data) for pk, data in load(missing).items()
+        }
+        cache.set_many(rendered, settings.TITLE_CARD_TTL)
+        cards.update(rendered)
+    return [cards[keys[pk]] for pk in keys if keys[pk] in cards]
+
+
+def assemble(envelope, cards):
+    """Собирает ответ списка из метаданных страницы и готовых карточек."""
+    head = render_json(envelope)
+    separator = ',' if len(head) > 2 else ''
+    return RawJSON('{}{}"results":[{}]}}'.format(
+        head[:-1], separator, ','.join(cards)
+    ))
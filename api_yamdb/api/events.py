@@ -0,0 +1,236 @@
+import json
+import logging
+import time
+from collections import defaultdict
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from reviews.models import ActivityEvent
+
+logger = logging.getLogger(__name__)
+
+
+def make_event(kind, data, title_id, review_id=None):
+    return ActivityEvent(
+        kind=kind,
+        title_id=title_id,
+        review_id=review_id,
+        object_id=data['id'],
+        payload=json.dumps(data, cls=JSONEncoder, ensure_ascii=False)
+    )
+
+
+def log_event(kind, data, title_id, review_id=None):
+    """Записывает событие в журнал.
+
+    Вызывается в транзакции создания объекта, поэтому событие видно
+    подписчикам только после коммита.
+    """
+    make_event(kind, data, title_id, review_id).save()
+
+
+def prune_events():
+    """Удаляет события старше EVENTS_RETENTION, возвращает их число."""
+    deleted, _ = ActivityEvent.objects.filter(
+        created__lt=timezone.now() - settings.EVENTS_RETENTION
+    ).delete()
+    return deleted
+
+
+def head_id():
+    """Id последнего события журнала."""
+    return ActivityEvent.objects.order_by('-id').values_list(
+        'id', flat=True
+    ).first() or 0
+
+
+def format_event(event):
+    return 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+        event.id, event.kind, event.payload
+    )
+
+
+class SubscribersLimitError(Exception):
+    """В воркере уже открыто EVENTS_MAX_SUBSCRIBERS потоков событий."""
+
+
+class EventHub:
+    """Раздача событий журнала подписчикам внутри процесса.
+
+    Один фоновый поток на воркер опрашивает журнал раз в
+    EVENTS_POLL_INTERVAL секунд и раскладывает новые события по очередям
+    подписчиков, поэтому число запросов к базе не зависит от числа
+    открытых потоков. Ключ подписки: ('title', id) или ('review', id).
+    Без подписчиков журнал не опрашивается, а при появлении первого
+    подписчика позиция заново читается с конца журнала. Старые события
+    удаляются и без подписчиков, а также командой prune_events.
+
+    Id событий выдаются при вставке, а видны они после коммита, поэтому
+    событие с меньшим id может появиться позже большего. Хаб раздает
+    события строго по порядку id: на пропуске в последовательности он
+    останавливается и ждет его заполнения до EVENTS_GAP_TIMEOUT секунд,
+    после чего пропуск (откаченная транзакция) считается пустым. Позиция
+    last_id - последний разданный id, до нее включительно журнал читают
+    новые потоки.
+
+    Каждый поток держит поток воркера, поэтому подписчиков не больше
+    EVENTS_MAX_SUBSCRIBERS, а их число (count) учитывается при отказах
+    по перегрузке (core.shedding).
+    """
+
+    batch_size = 500
+    queue_size = 1000
+
+    def __init__(self):
+        self.lock = Lock()
+        self.subscribers = defaultdict(set)
+        self.thread = None
+        self.last_id = None
+        self.pruned_at = 0
+        self.gap = None
+        self.count = 0
+
+    def subscribe(self, key):
+        queue = Queue(maxsize=self.queue_size)
+        with self.lock:
+            if self.count >= settings.EVENTS_MAX_SUBSCRIBERS:
+                raise SubscribersLimitError(
+                    'Too many event streams in this worker'
+                )
+            if not self.subscribers:
+                # Пока подписчиков не было, позиция не двигалась.
+                self.last_id = head_id()
+            self.subscribers[key].add(queue)
+            self.count += 1
+            if self.thread is None:
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+            return queue, self.last_id
+
+    def unsubscribe(self, key, queue):
+        with self.lock:
+            queues = self.subscribers.get(key, ())
+            if queue not in queues:
+                return
+            queues.discard(queue)
+            self.count -= 1
+            if not queues:
+                del self.subscribers[key]
+
+    def dispatch(self, event):
+        keys = [('title', event.title_id)]
+        if event.review_id is not None:
+            keys.append(('review', event.review_id))
+        # Позиция сдвигается вместе с выбором очередей: подписчик, пришедший
+        # позже, прочитает событие из журнала.
+        with self.lock:
+            queues = [
+                queue
+                for key in keys
+                for queue in self.subscribers.get(key, ())
+            ]
+            self.last_id = event.id
+        for queue in queues:
+            try:
+                queue.put_nowait(event)
+            except Full:
+                # Отстающий клиент переподключится с Last-Event-ID.
+                pass
+
+    def settled(self, event):
+        """Можно ли раздать event: все меньшие id уже разданы или пусты."""
+        expected = self.last_id + 1
+        if event.id == expected:
+            self.gap = None
+            return True
+        now = time.monotonic()
+        if self.gap is None or self.gap[0] != expected:
+            self.gap = (expected, now)
+        if now - self.gap[1] < settings.EVENTS_GAP_TIMEOUT:
+            return False
+        self.gap = None
+        return True
+
+    def poll(self):
+        with self.lock:
+            if not self.subscribers:
+                return
+        events = ActivityEvent.objects.filter(id__gt=self.last_id)[
+            :self.batch_size
+        ]
+        for event in events:
+            if not self.settled(event):
+                break
+            self.dispatch(event)
+
+    def prune(self):
+        now = time.monotonic()
+        if now - self.pruned_at < settings.EVENTS_RETENTION.total_seconds():
+            return
+        self.pruned_at = now
+        prune_events()
+
+    def run(self):
+        while True:
+            time.sleep(settings.EVENTS_POLL_INTERVAL)
+            try:
+                self.poll()
+                self.prune()
+            except Exception:
+                logger.exception('Failed to poll activity events')
+            finally:
+                close_old_connections()
+
+
+hub = EventHub()
+
+
+class EventStream:
+    """Поток server-sent events для StreamingHttpResponse.
+
+    Подписка оформляется при создании потока, до ответа, поэтому лимит
+    подписчиков можно вернуть обычным 503; close() снимает подписку, даже
+    если отдача так и не началась. Из журнала читаются события до позиции
+    хаба на момент подписки, дальше они приходят из очереди, а повторы
+    отсекаются по id. Без Last-Event-ID поток начинается с этой позиции.
+    После чтения пропущенных событий соединение с базой закрывается:
+    дальше события приходят из очереди, а поток может быть открыт часами.
+    """
+
+    def __init__(self, key, queryset, last_event_id):
+        self.key = key
+        self.queue, position = hub.subscribe(key)
+        self.events = self.generate(queryset, last_event_id, position)
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        hub.unsubscribe(self.key, self.queue)
+
+    def generate(self, queryset, last_event_id, position):
+        last_id = position if last_event_id is None else last_event_id
+        for event in queryset.filter(id__gt=last_id, id__lte=position)[
+            :settings.EVENTS_BACKLOG_LIMIT
+        ]:
+            last_id = event.id
+            yield format_event(event)
+        connection.close()
+        yield 'retry: {}\n\n'.format(
+            int(settings.EVENTS_POLL_INTERVAL * 1000)
+        )
+        while True:
+            try:
+                event = self.queue.get(timeout=settings.EVENTS_KEEPALIVE)
+            except Empty:
+                yield ': keepalive\n\n'
+                continue
+            if event.id <= last_id:
+                continue
+            last_id = event.id
+            yield format_event(event)
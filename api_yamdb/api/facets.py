@@ -0,0 +1,101 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from reviews.catalog import get_snapshot
+from reviews.models import Title
+
+GENERATION_KEY = 'title-facets:generation'
+FACETS_KEY = 'title-facets:{generation}:{version}:{params}'
+
+# Параметры, которые не меняют набор произведений.
+IGNORED_PARAMS = ('page', 'page_size', 'ordering', 'fields', 'format')
+
+
+def generation():
+    return cache.get_or_set(GENERATION_KEY, 1, None)
+
+
+def invalidate():
+    """Делает устаревшими все закэшированные фасеты.
+
+    Вызывается после фиксации транзакции, изменившей произведения или их
+    жанры.
+    """
+    def bump():
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.add(GENERATION_KEY, 1, None)
+    transaction.on_commit(bump)
+
+
+def facets_key(query_params):
+    params = sorted(
+        (name, sorted(values))
+        for name, values in query_params.lists()
+        if name not in IGNORED_PARAMS
+    )
+    return FACETS_KEY.format(
+        generation=generation(),
+        version=get_snapshot().version,
+        params=hashlib.sha1(repr(params).encode()).hexdigest()
+    )
+
+
+def catalog_counts(section, counts):
+    """Счетчики по id справочника в виде списка по убыванию числа."""
+    items = []
+    for row in section.rows:
+        if counts.get(row[0]):
+            obj = section.instance(row)
+            items.append({
+                'name': obj.name, 'slug': obj.slug, 'count': counts[row[0]]
+            })
+    return sorted(items, key=lambda item: (-item['count'], item['name']))
+
+
+def facet_counts(queryset):
+    """Число произведений по жанрам, категориям и периодам лет.
+
+    Каждый фасет считается одним сгруппированным запросом по id без
+    соединения со справочниками, названия и slug берутся из снимка
+    справочников. Общее число произведений складывается из групп по
+    категориям, включая произведения без категории.
+    """
+    queryset = queryset.order_by()
+    snapshot = get_snapshot()
+    bucket = settings.TITLE_FACETS_YEAR_BUCKET
+
+    categories = dict(
+        queryset.values_list('category_id').annotate(count=Count('pk'))
+    )
+    genres = dict(
+        Title.genre.through.objects.filter(
+            title__in=queryset.values('pk')
+        ).values_list('genre_id').annotate(count=Count('title_id'))
+    )
+    years = queryset.annotate(
+        bucket=(F('year') / bucket) * bucket
+    ).values_list('bucket').annotate(count=Count('pk')).order_by('bucket')
+
+    return {
+        'count': sum(categories.values()),
+        'genres': catalog_counts(snapshot.genres, genres),
+        'categories': catalog_counts(snapshot.categories, categories),
+        'years': [
+            {'from': start, 'to': start + bucket - 1, 'count': count}
+            for start, count in years
+        ],
+    }
+
+
+def get_facets(query_params, queryset):
+    """Фасеты из кэша или посчитанные заново на TITLE_FACETS_TTL секунд."""
+    return cache.get_or_set(
+        facets_key(query_params),
+        lambda: facet_counts(queryset),
+        settings.TITLE_FACETS_TTL
+    )
@@ -1,6 +1,9 @@
+from django.db.models import F
 from django_filters import FilterSet
-from django_filters.filters import CharFilter
-from reviews.models import Title
+from django_filters.filters import CharFilter, NumberFilter
+from rest_framework.filters import OrderingFilter
+from reviews.catalog import get_snapshot
+from reviews.models import Category, Genre, Title
 
 
 class TitleFilter(FilterSet):
@@ -9,14 +12,71 @@ class TitleFilter(FilterSet):
         lookup_expr='icontains'
     )
     genre = CharFilter(
-        field_name='genre__slug',
-        lookup_expr='icontains'
+        field_name='genre',
+        method='filter_catalog'
     )
     category = CharFilter(
-        field_name='category__slug',
-        lookup_expr='icontains'
+        field_name='category',
+        method='filter_catalog'
+    )
+    year_min = NumberFilter(
+        field_name='year',
+        lookup_expr='gte'
+    )
+    year_max = NumberFilter(
+        field_name='year',
+        lookup_expr='lte'
     )
 
     class Meta:
         model = Title
-        fields = ('name', 'year', 'genre', 'category', )
+        fields = ('name', 'year', 'year_min', 'year_max', 'genre',
+                  'category', )
+
+    def filter_catalog(self, queryset, name, value):
+        """Фильтр по части slug жанра или категории.
+
+        Подходящие slug ищутся в снимке справочников, в базу уходит
+        условие по id без соединения с таблицей справочника. Жанры
+        проверяются подзапросом к промежуточной таблице: соединение с ней
+        повторило бы произведение с несколькими подходящими жанрами.
+        """
+        model = {'genre': Genre, 'category': Category}[name]
+        ids = get_snapshot().section(model).ids_containing(value)
+        if model is Genre:
+            return queryset.filter(pk__in=Title.genre.through.objects.filter(
+                genre_id__in=ids
+            ).values('title_id'))
+        return queryset.filter(category_id__in=ids)
+
+
+class IndexedOrderingFilter(OrderingFilter):
+    """OrderingFilter, сортирующий по одному полю с индексом (поле, id).
+
+    Учитывается только первое поле из ?ordering=. К нему добавляется id в
+    том же направлении, так что страницы устойчивы при равных значениях, а
+    база читает строки прямо из индекса, в том числе обратным проходом.
+    Поля из nulls_last_fields сортируются с пустыми значениями в конце
+    при любом направлении.
+    """
+
+    nulls_last_fields = ('rating', )
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        return ordering[:1] if ordering else ordering
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        descending = ordering[0].startswith('-')
+        name = ordering[0].lstrip('-')
+        nulls_last = {'nulls_last': True} if (
+            name in self.nulls_last_fields
+        ) else {}
+        if descending:
+            return queryset.order_by(
+                F(name).desc(**nulls_last), F('pk').desc()
+            )
+        return queryset.order_by(F(name).asc(**nulls_last), F('pk').asc())
@@ -0,0 +1,136 @@
+import heapq
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+from functools import partial
+
+from core.paginator import EstimatedCountPaginator
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class ActivityPagination:
+    """Keyset-пагинация ленты активности пользователя.
+
+    Лента собирается из нескольких потоков (отзывы, комментарии), каждый
+    из которых уже отсортирован базой по индексу (author, pub_date).
+    Из каждого потока читается не больше page_size + 1 строк после курсора,
+    потоки сливаются в памяти, поэтому стоимость страницы не зависит от
+    её номера, в отличие от UNION с OFFSET.
+    """
+
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, streams):
+        # Порядок потоков задает порядок записей с одинаковым pub_date.
+        self.ranks = {kind: rank for rank, kind in enumerate(streams)}
+        self.streams = streams
+        self.page_size = api_settings.PAGE_SIZE
+
+    def sort_key(self, item):
+        kind, obj = item
+        return obj.pub_date, self.ranks[kind], obj.pk
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, kind, pk = (
+                b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            )
+            cursor = parse_datetime(pub_date), self.ranks[kind], int(pk)
+        except (BinasciiError, UnicodeError, KeyError, TypeError,
+                ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, item):
+        kind, obj = item
+        raw = '|'.join((obj.pub_date.isoformat(), kind, str(obj.pk)))
+        return b64encode(raw.encode('ascii')).decode('ascii')
+
+    def filter_stream(self, queryset, rank, cursor):
+        if cursor is None:
+            return queryset
+        pub_date, cursor_rank, pk = cursor
+        if rank < cursor_rank:
+            return queryset.filter(pub_date__lte=pub_date)
+        if rank > cursor_rank:
+            return queryset.filter(pub_date__lt=pub_date)
+        return queryset.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+        )
+
+    def paginate_streams(self, request):
+        self.request = request
+        cursor = self.decode_cursor(request)
+        limit = self.page_size + 1
+        iterables = []
+        for kind, queryset in self.streams.items():
+            queryset = self.filter_stream(
+                queryset, self.ranks[kind], cursor
+            ).order_by('-pub_date', '-pk')[:limit]
+            iterables.append([(kind, obj) for obj in queryset])
+
+        merged = list(heapq.merge(*iterables, key=self.sort_key,
+                                  reverse=True))
+        page = merged[:self.page_size]
+        self.next_cursor = (
+            self.encode_cursor(page[-1]) if len(merged) > len(page) else None
+        )
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class PageSizePagination(PageNumberPagination):
+    """Постраничная выдача с размером страницы, заданным клиентом.
+
+    Размер передается параметром page_size и ограничивается атрибутом
+    max_page_size вьюсета или настройкой MAX_PAGE_SIZE.
+    На больших выборках count берется из оценки планировщика, о чем
+    сообщает поле count_approximate. Вьюсет может вернуть точное число
+    объектов из метода get_exact_count(), тогда COUNT(*) не выполняется.
+    """
+
+    page_size_query_param = 'page_size'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.max_page_size = getattr(
+            view, 'max_page_size', settings.MAX_PAGE_SIZE
+        )
+        get_exact_count = getattr(view, 'get_exact_count', None)
+        self.django_paginator_class = partial(
+            EstimatedCountPaginator,
+            exact_count=get_exact_count() if get_exact_count else None
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_approximate', self.page.paginator.approximate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
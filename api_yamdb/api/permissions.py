@@ -1,4 +1,7 @@
 from rest_framework import permissions
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from users.models import User
 
 
@@ -45,5 +48,23 @@ class IsAdmin(permissions.BasePermission):
 class IsModerator(permissions.BasePermission):
     """Разрешает доступ модератору."""
 
+    def has_permission(self, request, view):
+        return request.user.role == User.MODERATOR
+
     def has_object_permission(self, request, view, obj):
         return request.user.role == User.MODERATOR
+
+
+def is_admin_request(request):
+    """Проверяет IsAdmin для обычного HttpRequest по его JWT.
+
+    Нужна в middleware, которые работают до аутентификации DRF.
+    """
+    drf_request = Request(request, authenticators=[JWTAuthentication()])
+    try:
+        user = drf_request.user
+    except APIException:
+        return False
+    return user.is_authenticated and IsAdmin().has_permission(
+        drf_request, None
+    )
@@ -1,20 +1,138 @@
+from collections import OrderedDict
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from rest_framework import serializers
+from django.utils.encoding import smart_str
+from rest_framework import permissions, serializers
+from rest_framework.validators import UniqueValidator
+from reviews.catalog import get_snapshot
 from reviews.models import Category, Comment, Genre, Review, Title
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+def get_requested_fields(request):
+    """Множество полей из параметра ?fields= безопасного запроса."""
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля, перечисленные в ?fields=.
+
+    Действует только на сериализатор верхнего уровня, вложенные
+    сериализаторы отдаются целиком.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = getattr(self, 'parent', None)
+        if isinstance(parent, serializers.ListSerializer):
+            parent = getattr(parent, 'parent', None)
+        if parent is not None:
+            return fields
+        requested = get_requested_fields(self.context.get('request'))
+        if not requested:
+            return fields
+        return OrderedDict(
+            (name, field) for name, field in fields.items()
+            if name in requested
+        )
+
+
+class BulkSlugRelatedField(serializers.ManyRelatedField):
+    """Список slug'ов, разрешаемый в объекты одним запросом к базе."""
+
+    default_error_messages = {
+        'does_not_exist': 'Объекты со slug {slugs} не существуют.',
+    }
+
+    child_class = serializers.SlugRelatedField
+
+    def __init__(self, queryset, slug_field='slug', **kwargs):
+        super().__init__(
+            child_relation=self.child_class(
+                queryset=queryset,
+                slug_field=slug_field
+            ),
+            **kwargs
+        )
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        slugs = [str(slug) for slug in data]
+        found = self.lookup(set(slugs))
+        missing = sorted(set(slugs) - set(found))
+        if missing:
+            self.fail('does_not_exist', slugs=', '.join(missing))
+        unique_slugs = OrderedDict.fromkeys(slugs)
+        return [found[slug] for slug in unique_slugs]
+
+    def lookup(self, slugs):
+        """Возвращает {slug: объект} для существующих slug."""
+        slug_field = self.child_relation.slug_field
+        return {
+            getattr(obj, slug_field): obj
+            for obj in self.child_relation.get_queryset().filter(
+                **{slug_field + '__in': slugs}
+            )
+        }
+
+
+class CatalogSlugRelatedField(serializers.SlugRelatedField):
+    """Slug категории или жанра, разрешаемый по снимку справочников.
+
+    Запроса к базе нет, queryset нужен только для выбора справочника и
+    для browsable API.
+    """
+
+    def to_internal_value(self, data):
+        section = get_snapshot().section(self.get_queryset().model)
+        obj = section.get(smart_str(data))
+        if obj is None:
+            self.fail(
+                'does_not_exist',
+                slug_name=self.slug_field,
+                value=smart_str(data)
+            )
+        return obj
+
+
+class CatalogBulkSlugRelatedField(BulkSlugRelatedField):
+    """Список slug'ов категорий или жанров по снимку справочников."""
+
+    child_class = CatalogSlugRelatedField
+
+    def lookup(self, slugs):
+        section = get_snapshot().section(
+            self.child_relation.get_queryset().model
+        )
+        return {
+            slug: section.get(slug)
+            for slug in slugs
+            if slug in section.by_slug
+        }
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['username', 'email', 'first_name', 'last_name', 'bio',
                   'role']
 
 
-class MeSerializer(serializers.ModelSerializer):
+class MeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['username', 'email', 'first_name', 'last_name', 'bio',
@@ -23,12 +141,44 @@ class MeSerializer(serializers.ModelSerializer):
 
 
 class SignUpSerializer(serializers.ModelSerializer):
+    """Регистрация пользователя.
+
+    Если в context передан список matches - пользователи, уже найденные
+    по username или email, - уникальность проверяется по нему, без
+    отдельных запросов UniqueValidator на каждое поле.
+    """
+
     BANED_USERNAMES = ['me']
 
     class Meta:
         model = User
         fields = ['username', 'email']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        self.unique_messages = {}
+        if 'matches' not in self.context:
+            return fields
+        for name, field in fields.items():
+            validators = []
+            for validator in field.validators:
+                if isinstance(validator, UniqueValidator):
+                    self.unique_messages[name] = validator.message
+                else:
+                    validators.append(validator)
+            field.validators = validators
+        return fields
+
+    def validate(self, data):
+        errors = {}
+        for user in self.context.get('matches', ()):
+            for name, message in self.unique_messages.items():
+                if getattr(user, name) == data[name]:
+                    errors[name] = [message]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return data
+
     def validate_username(self, value):
         if value in self.BANED_USERNAMES:
             raise serializers.ValidationError(
@@ -45,7 +195,10 @@ class TokenSerializer(serializers.Serializer):
     confirmation_code = serializers.CharField()
 
     def validate(self, data):
-        user = get_object_or_404(User, username=data.get('username'))
+        user = get_object_or_404(
+            User, username=data.get('username'), is_active=True
+        )
+        data['user'] = user
 
         token_valid = default_token_generator.check_token(
             user, data.get('confirmation_code')
@@ -63,7 +216,7 @@ class TokenSerializer(serializers.Serializer):
         return data
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(
         read_only=True,
         slug_field='username'
@@ -77,7 +230,7 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(
         read_only=True,
         slug_field='username',
@@ -87,37 +240,92 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only=True
     )
 
+    # Повторный отзыв отсекает ограничение unique_review при вставке.
+    duplicate_message = 'Вы уже писали отзыв на это произведение.'
+
     class Meta:
         model = Review
-        fields = '__all__'
+        fields = ('id', 'text', 'author', 'score', 'pub_date', 'title')
+
 
-    def validate(self, attrs):
-        if self.context['request']._request.method != 'POST':
-            return attrs
+class BulkReviewSerializer(serializers.ModelSerializer):
+    """Элемент массовой загрузки отзывов.
 
-        if Review.objects.filter(
-                title_id=self.context['view'].kwargs['title_id'],
-                author=self.context['request'].user
-        ).exists():
+    Произведение и автор проверяются во вьюсете сразу для всей пачки,
+    здесь только приводятся к типам.
+    """
+
+    title = serializers.IntegerField()
+    author = serializers.CharField(max_length=150)
+
+    class Meta:
+        model = Review
+        fields = ('title', 'author', 'text', 'score')
+
+
+class BulkCommentSerializer(serializers.ModelSerializer):
+    """Элемент массовой загрузки комментариев."""
+
+    review = serializers.IntegerField()
+    author = serializers.CharField(max_length=150)
+
+    class Meta:
+        model = Comment
+        fields = ('review', 'author', 'text')
+
+
+class ModerationDeleteSerializer(serializers.Serializer):
+    """Условия массового удаления отзывов и комментариев.
+
+    Нужен автор или список id. Все переданные условия объединяются через
+    И. Если заданы reviews или comments, удаляются только перечисленные
+    объекты; автор без id удаляет и отзывы, и комментарии автора.
+    """
+
+    author = serializers.SlugRelatedField(
+        slug_field='username',
+        queryset=User.objects.all(),
+        required=False
+    )
+    reviews = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=settings.MODERATION_IDS_LIMIT
+    )
+    comments = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=settings.MODERATION_IDS_LIMIT
+    )
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if not {'author', 'reviews', 'comments'} & data.keys():
+            raise serializers.ValidationError(
+                'Укажите автора или id отзывов и комментариев.'
+            )
+        if ('since' in data and 'until' in data
+                and data['since'] > data['until']):
             raise serializers.ValidationError(
-                'Вы уже писали отзыв на это произведение.'
+                {'until': 'Конец периода раньше начала.'}
             )
-        return attrs
+        return data
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ('name', 'slug', )
 
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = ('name', 'slug', )
 
 
-class TitleSerializer(serializers.ModelSerializer):
+class TitleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(
         read_only=True
     )
@@ -131,21 +339,62 @@ class TitleSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Title
-        fields = '__all__'
+        fields = ('id', 'name', 'year', 'rating', 'description', 'genre',
+                  'category')
 
 
 class TitlePostSerializer(serializers.ModelSerializer):
-    category = serializers.SlugRelatedField(
+    category = CatalogSlugRelatedField(
         queryset=Category.objects.all(),
         slug_field='slug',
         required=False
     )
-    genre = serializers.SlugRelatedField(
+    genre = CatalogBulkSlugRelatedField(
         queryset=Genre.objects.all(),
-        slug_field='slug',
-        required=False, many=True
+        required=False
     )
 
     class Meta:
         model = Title
-        fields = '__all__'
+        fields = ('id', 'name', 'year', 'description', 'genre', 'category')
+
+    @staticmethod
+    def write_genres(title, genres, created=False):
+        """Записывает жанры произведения разницей с текущим набором.
+
+        Вместо поштучных операций RelatedManager.set() удаляет лишние строки
+        промежуточной таблицы одним DELETE и добавляет новые одним INSERT.
+        """
+        through = Title.genre.through
+        genre_ids = {genre.pk for genre in genres}
+        current_ids = set() if created else set(
+            through.objects.filter(title=title).values_list(
+                'genre_id', flat=True
+            )
+        )
+        if current_ids - genre_ids:
+            through.objects.filter(
+                title=title,
+                genre_id__in=current_ids - genre_ids
+            ).delete()
+        through.objects.bulk_create([
+            through(title=title, genre_id=genre_id)
+            for genre_id in genre_ids - current_ids
+        ])
+
+    @transaction.atomic
+    def create(self, validated_data):
+        genres = validated_data.pop('genre', [])
+        title = Title.objects.create(**validated_data)
+        self.write_genres(title, genres, created=True)
+        return title
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        genres = validated_data.pop('genre', None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save()
+        if genres is not None:
+            self.write_genres(instance, genres)
+        return instance
@@ -0,0 +1,92 @@
+from core.cache_purge import purge_paths
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+from reviews.models import Category, Comment, Genre, Review, Title
+from reviews.moderation import rows_deleted
+
+from . import facets
+
+
+def title_paths(title_id):
+    return [
+        reverse('titles-list'),
+        reverse('titles-detail', args=[title_id]),
+    ]
+
+
+@receiver([post_save, post_delete], sender=Title)
+def title_changed(sender, instance, **kwargs):
+    purge_paths(title_paths(instance.pk))
+    facets.invalidate()
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_genres_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        facets.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Genre)
+def genre_changed(sender, instance, **kwargs):
+    purge_paths([reverse('genres-list'), reverse('titles-list')])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    purge_paths([reverse('categories-list'), reverse('titles-list')])
+
+
+def review_paths(title_id, review_id, deleted=False):
+    paths = title_paths(title_id) + [
+        reverse('reviews-list', kwargs={'title_id': title_id}),
+        reverse('reviews-detail', kwargs={
+            'title_id': title_id, 'pk': review_id
+        }),
+    ]
+    if deleted:
+        # Комментарии удаленного отзыва уходят каскадом без своих путей.
+        paths.append(reverse('comments-list', kwargs={
+            'title_id': title_id, 'review_id': review_id
+        }))
+    return paths
+
+
+def comment_paths(title_id, review_id, comment_id):
+    review = {'title_id': title_id, 'review_id': review_id}
+    return [
+        reverse('comments-list', kwargs=review),
+        reverse('comments-detail', kwargs=dict(review, pk=comment_id)),
+    ]
+
+
+@receiver([post_save, post_delete], sender=Review)
+def review_changed(sender, instance, signal, **kwargs):
+    purge_paths(review_paths(
+        instance.title_id, instance.pk, deleted=signal is post_delete
+    ))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    # При каскадном удалении отзыв не загружен, а его пути обновляет
+    # обработчик удаления самого отзыва.
+    if not Comment._meta.get_field('review').is_cached(instance):
+        return
+    purge_paths(comment_paths(
+        instance.review.title_id, instance.review_id, instance.pk
+    ))
+
+
+@receiver(rows_deleted, sender=Review)
+def reviews_deleted(sender, rows, **kwargs):
+    purge_paths([
+        path
+        for title_id, review_id in rows
+        for path in review_paths(title_id, review_id, deleted=True)
+    ])
+
+
+@receiver(rows_deleted, sender=Comment)
+def comments_deleted(sender, rows, **kwargs):
+    purge_paths([path for row in rows for path in comment_paths(*row)])
@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from threading import Lock
+
+from django.db import DatabaseError
+from rest_framework.throttling import SimpleRateThrottle
+
+LOCAL_BUCKETS_LIMIT = 10000
+
+LOCK_KEY = 'throttle:lock:{}'
+# Блокировка держится на время одного чтения и одной записи; срок
+# нужен только на случай, если воркер упал, не сняв ее.
+LOCK_TIMEOUT = 1
+
+# Ошибки недоступного кэша: сетевые бэкенды поднимают ошибки сокетов,
+# DatabaseCache - ошибки базы. Остальные исключения не маскируются.
+CACHE_ERRORS = (OSError, DatabaseError)
+
+_local_buckets = OrderedDict()
+_local_lock = Lock()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Ограничение частоты запросов по алгоритму token bucket.
+
+    Для каждого идентификатора в кэше хранится пара (токены, время), поэтому
+    проверка стоит фиксированное число обращений к кэшу независимо от
+    лимита, в отличие от SimpleRateThrottle, который хранит историю всех
+    запросов. Корзины запроса блокируются через cache.add, проверяются все
+    и только потом списываются все вместе: одновременные запросы не
+    перезаписывают списания друг друга, а отказ одной корзины не тратит
+    токены остальных. Если общий кэш недоступен или корзину держит другой
+    запрос, используются корзины в памяти процесса.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.wait_seconds = None
+
+    def get_idents(self, request, view):
+        """Возвращает идентификаторы, для каждого из которых есть корзина."""
+        raise NotImplementedError('.get_idents() must be overridden')
+
+    def get_cache_key(self, request, view):
+        return None
+
+    def take(self, buckets, keys):
+        """Новые состояния корзин keys после списания токена из каждой.
+
+        Возвращает None и выставляет wait_seconds, если хотя бы одна
+        корзина пуста.
+        """
+        now = self.timer()
+        updated = {}
+        waits = []
+        for key in keys:
+            tokens, stamp = buckets.get(key) or (self.num_requests, now)
+            tokens = min(
+                self.num_requests,
+                tokens + (now - stamp) * self.num_requests / self.duration
+            )
+            if tokens < 1:
+                waits.append((1 - tokens) * self.duration / self.num_requests)
+            updated[key] = (tokens - 1, now)
+        if waits:
+            self.wait_seconds = max(waits)
+            return None
+        return updated
+
+    def consume_shared(self, keys):
+        """Списание из корзин в общем кэше.
+
+        Возвращает None, если корзину уже держит другой запрос: ждать ее в
+        потоке запроса не стоит, решение принимает корзина процесса.
+        """
+        acquired = []
+        try:
+            for lock in (LOCK_KEY.format(key) for key in keys):
+                if not self.cache.add(lock, 1, LOCK_TIMEOUT):
+                    return None
+                acquired.append(lock)
+            updated = self.take(self.cache.get_many(keys), keys)
+            if updated is None:
+                return False
+            self.cache.set_many(updated, self.duration)
+            return True
+        finally:
+            self.cache.delete_many(acquired)
+
+    def consume_local(self, keys):
+        with _local_lock:
+            updated = self.take(_local_buckets, keys)
+            if updated is None:
+                return False
+            for key, bucket in updated.items():
+                _local_buckets[key] = bucket
+                _local_buckets.move_to_end(key)
+            while len(_local_buckets) > LOCAL_BUCKETS_LIMIT:
+                _local_buckets.popitem(last=False)
+            return True
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        # Блокировки берутся в одном порядке, чтобы два запроса с общими
+        # корзинами не держали каждый по половине.
+        keys = sorted({
+            self.cache_format % {'scope': self.scope, 'ident': ident}
+            for ident in self.get_idents(request, view)
+            if ident
+        })
+        if not keys:
+            return True
+        try:
+            allowed = self.consume_shared(keys)
+        except CACHE_ERRORS:
+            allowed = None
+        if allowed is None:
+            return self.consume_local(keys)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+    """Корзина на IP-адрес клиента."""
+
+    def get_idents(self, request, view):
+        return [self.get_ident(request)]
+
+
+class CredentialsThrottle(TokenBucketThrottle):
+    """Корзины на username и email из тела запроса."""
+
+    fields = ('username', 'email')
+
+    def get_idents(self, request, view):
+        return [
+            '{}:{}'.format(field, str(request.data.get(field)).lower())
+            for field in self.fields
+            if request.data.get(field)
+        ]
+
+
+class RoleThrottle(TokenBucketThrottle):
+    """Корзина на пользователя с лимитом, зависящим от его роли.
+
+    Лимит берется из DEFAULT_THROTTLE_RATES по ключу <scope>_<role>,
+    ограничиваются только запросы с методами из methods.
+    """
+
+    methods = ('POST', )
+
+    def __init__(self):
+        self.base_scope = self.scope
+        self.rate = None
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        if (request.method not in self.methods
+                or not request.user.is_authenticated):
+            return True
+        self.scope = '{}_{}'.format(self.base_scope, request.user.role)
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_rate(self):
+        return self.THROTTLE_RATES.get(self.scope)
+
+    def get_idents(self, request, view):
+        return [request.user.pk]
+
+
+class SignUpIPThrottle(IPThrottle):
+    scope = 'signup'
+
+
+class SignUpCredentialsThrottle(CredentialsThrottle):
+    scope = 'signup_credentials'
+
+
+class TokenIPThrottle(IPThrottle):
+    scope = 'token'
+
+
+class TokenCredentialsThrottle(CredentialsThrottle):
+    scope = 'token_credentials'
+    fields = ('username', )
+
+
+class ContentCreateThrottle(RoleThrottle):
+    """Ограничивает создание отзывов и комментариев."""
+
+    scope = 'content_create'
+    methods = ('POST', 'PUT')
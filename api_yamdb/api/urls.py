@@ -1,9 +1,11 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CategoryViewSet, CommentViewSet, GenreViewSet,
-                    ReviewViewSet, TitleViewSet, UserMe, UserViewSet,
-                    get_token, signup)
+from .views import (CategoryViewSet, CommentBulkCreate, CommentViewSet,
+                    GenreViewSet, MemoryDiagnostics, ModerationDeleteView,
+                    ReviewBulkCreate, ReviewViewSet, TitleBulkCreate,
+                    TitleViewSet, UserMe, UserMeActivity, UserViewSet,
+                    get_token, review_events, signup, title_events)
 
 router = DefaultRouter()
 
@@ -27,5 +29,20 @@ urlpatterns = [
     path('v1/auth/signup/', signup, name='signup'),
     path('v1/auth/token/', get_token, name='token'),
     path('v1/users/me/', UserMe.as_view(), name='profile'),
+    path('v1/users/me/activity/', UserMeActivity.as_view(),
+         name='profile-activity'),
+    path('v1/titles/<int:title_id>/events/', title_events,
+         name='title-events'),
+    path('v1/titles/<int:title_id>/reviews/<int:review_id>/events/',
+         review_events, name='review-events'),
+    path('v1/bulk/titles/', TitleBulkCreate.as_view(), name='bulk-titles'),
+    path('v1/bulk/reviews/', ReviewBulkCreate.as_view(),
+         name='bulk-reviews'),
+    path('v1/bulk/comments/', CommentBulkCreate.as_view(),
+         name='bulk-comments'),
+    path('v1/moderation/delete/', ModerationDeleteView.as_view(),
+         name='moderation-delete'),
+    path('v1/diagnostics/memory/', MemoryDiagnostics.as_view(),
+         name='diagnostics-memory'),
     path('v1/', include(router.urls))
 ]
@@ -1,30 +1,57 @@
+from core.cache_purge import purge_paths
+from core.memory import tracker
+from core.shedding import overloaded_response
+from core.singleflight import single_flight
 from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import send_mail
-from django.db.models import Avg
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_GET
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (action, api_view, permission_classes,
+                                       throttle_classes)
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import SearchFilter
-from rest_framework.generics import RetrieveAPIView, UpdateAPIView
+from rest_framework.generics import (GenericAPIView, RetrieveAPIView,
+                                     UpdateAPIView)
 from rest_framework.mixins import (CreateModelMixin, DestroyModelMixin,
                                    ListModelMixin)
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
-from rest_framework_simplejwt.tokens import RefreshToken
-from reviews.models import Category, Genre, Review, Title
+from rest_framework_simplejwt.tokens import AccessToken
+from reviews.bulk import create_comments, create_reviews, create_titles
+from reviews.catalog import get_snapshot
+from reviews.models import (ActivityEvent, Category, Comment, Genre, Review,
+                            SimilarTitle, Title)
+from reviews.moderation import delete_comments, delete_reviews
 from users.models import User
 
-from .filters import TitleFilter
+from .cards import CardJSONRenderer, assemble, get_cards
+from .events import EventStream, SubscribersLimitError, log_event, make_event
+from .facets import get_facets
+from .facets import invalidate as invalidate_facets
+from .filters import IndexedOrderingFilter, TitleFilter
+from .pagination import ActivityPagination, PageSizePagination
 from .permissions import (IsAdmin, IsAuthenticated, IsAuthor, IsModerator,
                           ReadOnly)
-from .serializers import (CategorySerializer, CommentSerializer,
-                          GenreSerializer, MeSerializer, ReviewSerializer,
+from .serializers import (BulkCommentSerializer, BulkReviewSerializer,
+                          CategorySerializer, CommentSerializer,
+                          GenreSerializer, MeSerializer,
+                          ModerationDeleteSerializer, ReviewSerializer,
                           SignUpSerializer, TitlePostSerializer,
-                          TitleSerializer, TokenSerializer, UserSerializer)
+                          TitleSerializer, TokenSerializer, UserSerializer,
+                          get_requested_fields)
+from .throttling import (ContentCreateThrottle, SignUpCredentialsThrottle,
+                         SignUpIPThrottle, TokenCredentialsThrottle,
+                         TokenIPThrottle)
 
 
 def send_confirmation(user):
@@ -39,17 +66,189 @@ def send_confirmation(user):
     )
 
 
-class UserViewSet(ModelViewSet):
+def activity_response(request, user):
+    """Лента отзывов и комментариев пользователя, новые записи первыми."""
+    paginator = ActivityPagination({
+        'review': user.reviews.select_related('author'),
+        'comment': user.comments.select_related('author'),
+    })
+    page = paginator.paginate_streams(request)
+    serializers = {'review': ReviewSerializer, 'comment': CommentSerializer}
+    data = [
+        dict(serializers[kind](obj).data, type=kind) for kind, obj in page
+    ]
+    return paginator.get_paginated_response(data)
+
+
+class SparseFieldsQuerysetMixin:
+    """Не загружает из базы колонки, не попавшие в ?fields=.
+
+    Откладываются (defer) простые поля модели, которые не нужны ни
+    одному из запрошенных полей сериализатора; если не запрошено ни одно
+    связанное поле, снимаются select_related и prefetch_related.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested = get_requested_fields(self.request)
+        if not requested or self.action not in ('list', 'retrieve'):
+            return queryset
+
+        serializer_fields = self.get_serializer_class()().fields
+        sources = {
+            field.source.split('.')[0]
+            for name, field in serializer_fields.items()
+            if name in requested
+        }
+        if '*' in sources:
+            return queryset
+
+        opts = queryset.model._meta
+        deferred = [
+            field.name for field in opts.concrete_fields
+            if not field.primary_key
+            and not field.is_relation
+            and field.name not in sources
+        ]
+        if not any(field.name in sources for field in opts.many_to_many):
+            queryset = queryset.prefetch_related(None)
+        if not any(
+            field.is_relation and field.name in sources
+            for field in opts.concrete_fields
+        ):
+            queryset = queryset.select_related(None)
+        return queryset.defer(*deferred)
+
+
+class SoftDeleteMixin:
+    """Удаляет объект пометкой deleted_at, если включен SOFT_DELETE.
+
+    Связанные отзывы и комментарии потом удаляет пачками команда
+    purge_deleted, поэтому запрос не ждет каскадного удаления.
+    """
+
+    def perform_destroy(self, instance):
+        if settings.SOFT_DELETE:
+            instance.soft_delete()
+        else:
+            instance.delete()
+
+
+class SingleFlightMixin:
+    """Объединяет одновременные одинаковые запросы list и retrieve.
+
+    Права проверяются для каждого запроса отдельно, общими становятся
+    данные, статус и заголовки ответа, поэтому смешивается только во
+    вьюсеты, ответ которых не зависит от пользователя. Формат ответа
+    выбирается по Accept и ?format=, поэтому выбранный рендерер входит в
+    ключ.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.single_flight(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.single_flight(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def single_flight(self, method, request, *args, **kwargs):
+        if not settings.SINGLE_FLIGHT:
+            return method(request, *args, **kwargs)
+        key = '{} {} {}{}'.format(
+            request.accepted_renderer.format, request.accepted_media_type,
+            request.get_host(), request.get_full_path()
+        )
+        data, status_code, headers = single_flight(
+            key, lambda: self.response_parts(method(request, *args, **kwargs))
+        )
+        return Response(data, status=status_code, headers=headers)
+
+    @staticmethod
+    def response_parts(response):
+        # Content-Type выставляет рендерер каждого запроса.
+        headers = {
+            name: value for name, value in response.items()
+            if name.lower() != 'content-type'
+        }
+        return response.data, response.status_code, headers
+
+
+class TitleCardListMixin:
+    """Список произведений, собранный из готовых JSON-карточек.
+
+    Из базы читаются только id и отметки изменения произведений страницы,
+    карточки берутся из кэша одним get_many (api.cards). Запросы с
+    ?fields= и не в JSON сериализуются как обычно.
+    """
+
+    renderer_classes = [CardJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        if (not settings.TITLE_CARDS
+                or get_requested_fields(request)
+                or not isinstance(request.accepted_renderer,
+                                  CardJSONRenderer)):
+            return super().list(request, *args, **kwargs)
+        rows = self.filter_queryset(self.base_queryset.all()).values_list(
+            'pk', 'changed_at', 'reviews_changed_at'
+        )
+        cards = get_cards(self.paginate_queryset(rows), self.load_cards)
+        envelope = self.get_paginated_response([]).data
+        del envelope['results']
+        return Response(assemble(envelope, cards))
+
+    def load_cards(self, pks):
+        serializer = self.get_serializer(
+            self.get_queryset().filter(pk__in=pks), many=True
+        )
+        return {item['id']: item for item in serializer.data}
+
+
+class CatalogListMixin:
+    """Список категорий или жанров из снимка справочников воркера.
+
+    Запросов к базе нет. Поиск повторяет SearchFilter: каждое слово из
+    ?search= должно входить хотя бы в одно из search_fields без учета
+    регистра.
+    """
+
+    def list(self, request, *args, **kwargs):
+        terms = [
+            term.lower()
+            for term in SearchFilter().get_search_terms(request)
+        ]
+        objects = [
+            obj
+            for obj in get_snapshot().section(self.queryset.model).all()
+            if all(
+                any(term in str(getattr(obj, field)).lower()
+                    for field in self.search_fields)
+                for term in terms
+            )
+        ]
+        page = self.paginate_queryset(objects)
+        if page is None:
+            return Response(self.get_serializer(objects, many=True).data)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class UserViewSet(SparseFieldsQuerysetMixin, SoftDeleteMixin, ModelViewSet):
     """ViewSet для ресурса users."""
 
     serializer_class = UserSerializer
-    queryset = User.objects.all()
+    queryset = User.objects.filter(deleted_at__isnull=True)
     lookup_field = 'username'
     permission_classes = [IsAuthenticated & IsAdmin]
-    pagination_class = PageNumberPagination
+    pagination_class = PageSizePagination
     filter_backends = [SearchFilter]
     search_fields = ['username']
 
+    @action(detail=True, methods=['get'])
+    def activity(self, request, username=None):
+        return activity_response(request, self.get_object())
+
 
 class UserMe(RetrieveAPIView, UpdateAPIView):
     """View для users/me/."""
@@ -60,27 +259,44 @@ class UserMe(RetrieveAPIView, UpdateAPIView):
         return self.request.user
 
 
+class UserMeActivity(GenericAPIView):
+    """View для users/me/activity/."""
+
+    def get(self, request):
+        return activity_response(request, request.user)
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([SignUpIPThrottle, SignUpCredentialsThrottle])
 def signup(request):
     """Регистрация пользователя.
 
     Создает нового пользователя, отправляет на указанный email код
     подтверждения.
     Если пользователь с полученными username и email уже существует -
-    отправляет ему код подтверждения.
+    отправляет ему код подтверждения. Удаленному (неактивному)
+    пользователю код не отправляется, его username и email остаются
+    занятыми.
     """
-    user = User.objects.filter(
-        username=request.data.get('username'),
-        email=request.data.get('email')
-    ).first()
+    username = request.data.get('username')
+    email = request.data.get('email')
+    # Один запрос находит и существующего пользователя, и тех, с кем
+    # конфликтуют username или email нового.
+    matches = list(
+        User.objects.filter(Q(username=username) | Q(email=email))[:2]
+    )
 
-    if user:
-        send_confirmation(user)
-        return Response('Мы отправили код подтверждения на вашу почту.',
-                        status=status.HTTP_200_OK)
+    for user in matches:
+        if (user.username == username and user.email == email
+                and user.is_active):
+            send_confirmation(user)
+            return Response('Мы отправили код подтверждения на вашу почту.',
+                            status=status.HTTP_200_OK)
 
-    serializer = SignUpSerializer(data=request.data)
+    serializer = SignUpSerializer(
+        data=request.data, context={'matches': matches}
+    )
     serializer.is_valid(raise_exception=True)
     user = serializer.save()
     send_confirmation(user)
@@ -89,6 +305,7 @@ def signup(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([TokenIPThrottle, TokenCredentialsThrottle])
 def get_token(request):
     """Получение JWT-токена.
 
@@ -96,97 +313,554 @@ def get_token(request):
     """
     serializer = TokenSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
-    user = get_object_or_404(User, username=request.data.get('username'))
-    jwt_token = str(RefreshToken.for_user(user).access_token)
+    jwt_token = str(AccessToken.for_user(serializer.validated_data['user']))
     return Response({'token': jwt_token}, status=status.HTTP_200_OK)
 
 
-class CommentViewSet(ModelViewSet):
+def get_last_event_id(request):
+    """Id последнего полученного события из заголовка Last-Event-ID."""
+    value = request.META.get(
+        'HTTP_LAST_EVENT_ID', request.GET.get('last_event_id')
+    )
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def stream_response(key, queryset, request):
+    try:
+        stream = EventStream(key, queryset, get_last_event_id(request))
+    except SubscribersLimitError:
+        return overloaded_response()
+    response = StreamingHttpResponse(
+        stream, content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_GET
+def title_events(request, title_id):
+    """Поток новых отзывов и комментариев к произведению (SSE)."""
+    get_object_or_404(Title, pk=title_id, deleted_at__isnull=True)
+    return stream_response(
+        ('title', title_id),
+        ActivityEvent.objects.filter(title_id=title_id),
+        request
+    )
+
+
+@require_GET
+def review_events(request, title_id, review_id):
+    """Поток новых комментариев к отзыву (SSE)."""
+    get_object_or_404(
+        Review, pk=review_id, title_id=title_id,
+        title__deleted_at__isnull=True
+    )
+    return stream_response(
+        ('review', review_id),
+        ActivityEvent.objects.filter(review_id=review_id),
+        request
+    )
+
+
+class CommentViewSet(SingleFlightMixin, SparseFieldsQuerysetMixin,
+                     ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [
         IsAuthenticated
         & (IsAuthor | IsModerator | IsAdmin)
         | ReadOnly
     ]
-    pagination_class = PageNumberPagination
+    pagination_class = PageSizePagination
+    throttle_classes = [ContentCreateThrottle]
 
     def get_queryset(self):
         title_id = self.kwargs.get('title_id')
         review_id = self.kwargs.get('review_id')
-        get_object_or_404(Title, pk=title_id)
-        review = get_object_or_404(Review, pk=review_id)
-        return review.comments.all()
+        get_object_or_404(Title, pk=title_id, deleted_at__isnull=True)
+        self.review = get_object_or_404(Review, pk=review_id)
+        return self.review.comments.all()
+
+    def get_exact_count(self):
+        return self.review.comment_count
 
+    @transaction.atomic
     def perform_create(self, serializer):
         title_id = self.kwargs.get('title_id')
         review_id = self.kwargs.get('review_id')
-        get_object_or_404(Title, pk=title_id)
+        get_object_or_404(Title, pk=title_id, deleted_at__isnull=True)
         review = get_object_or_404(Review, pk=review_id)
         serializer.save(review=review, author=self.request.user)
+        log_event(ActivityEvent.COMMENT, serializer.data, review.title_id,
+                  review.pk)
 
 
-class ReviewViewSet(ModelViewSet):
+class ReviewViewSet(SingleFlightMixin, SparseFieldsQuerysetMixin,
+                    ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = [
         IsAuthenticated
         & (IsAuthor | IsModerator | IsAdmin)
         | ReadOnly
     ]
-    pagination_class = PageNumberPagination
+    pagination_class = PageSizePagination
+    throttle_classes = [ContentCreateThrottle]
 
     def get_queryset(self):
         title_id = self.kwargs.get('title_id')
-        title = get_object_or_404(Title, pk=title_id)
-        return title.reviews.all()
+        self.title = get_object_or_404(
+            Title, pk=title_id, deleted_at__isnull=True
+        )
+        return self.title.reviews.all()
+
+    def get_exact_count(self):
+        return self.title.review_count
 
+    @transaction.atomic
     def perform_create(self, serializer):
         title_id = self.kwargs.get('title_id')
-        title = get_object_or_404(Title, pk=title_id)
+        title = get_object_or_404(
+            Title, pk=title_id, deleted_at__isnull=True
+        )
         author = self.request.user
-        serializer.save(title=title, author=author)
-
-
-class CategoryViewSet(CreateModelMixin, ListModelMixin, DestroyModelMixin,
-                      GenericViewSet):
+        try:
+            with transaction.atomic():
+                serializer.save(title=title, author=author)
+        except IntegrityError:
+            raise ValidationError(
+                {'non_field_errors': [ReviewSerializer.duplicate_message]}
+            )
+        log_event(ActivityEvent.REVIEW, serializer.data, title.pk)
+
+    @action(detail=False, methods=['put'], url_path='mine')
+    def mine(self, request, title_id=None):
+        """Создает или обновляет отзыв текущего пользователя."""
+        title = get_object_or_404(
+            Title, pk=title_id, deleted_at__isnull=True
+        )
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            review, created = Review.objects.update_or_create(
+                title=title,
+                author=request.user,
+                defaults=serializer.validated_data
+            )
+            data = self.get_serializer(review).data
+            if created:
+                log_event(ActivityEvent.REVIEW, data, title.pk)
+        return Response(
+            data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+
+class CategoryViewSet(CatalogListMixin, CreateModelMixin,
+                      ListModelMixin, DestroyModelMixin, GenericViewSet):
     serializer_class = CategorySerializer
     queryset = Category.objects.all()
     permission_classes = [
         (IsAuthenticated & IsAdmin) | ReadOnly
     ]
-    pagination_class = PageNumberPagination
+    pagination_class = PageSizePagination
     filter_backends = [SearchFilter]
     search_fields = ('name', )
     lookup_field = 'slug'
 
 
-class GenreViewSet(CreateModelMixin, ListModelMixin, DestroyModelMixin,
-                   GenericViewSet):
+class GenreViewSet(CatalogListMixin, CreateModelMixin,
+                   ListModelMixin, DestroyModelMixin, GenericViewSet):
     serializer_class = GenreSerializer
     queryset = Genre.objects.all()
     permission_classes = [
         (IsAuthenticated & IsAdmin) | ReadOnly
     ]
-    pagination_class = PageNumberPagination
+    pagination_class = PageSizePagination
     filter_backends = [SearchFilter]
     search_fields = ('name', )
     lookup_field = 'slug'
 
 
-class TitleViewSet(ModelViewSet):
-    queryset = Title.objects.all().annotate(rating=Avg('reviews__score'))
+class TitleViewSet(SingleFlightMixin, TitleCardListMixin,
+                   SparseFieldsQuerysetMixin, SoftDeleteMixin, ModelViewSet):
+    base_queryset = Title.objects.filter(deleted_at__isnull=True)
+    queryset = base_queryset.select_related('category').prefetch_related(
+        'genre'
+    )
     permission_classes = [
         (IsAuthenticated & IsAdmin) | ReadOnly
     ]
-    pagination_class = PageNumberPagination
-    filter_backends = [DjangoFilterBackend, ]
+    pagination_class = PageSizePagination
+    filter_backends = [DjangoFilterBackend, IndexedOrderingFilter]
     filterset_class = TitleFilter
     filterset_fields = ('name', 'year', 'genre', 'category', )
+    ordering_fields = ('rating', 'year', 'name', 'review_count')
     search_fields = ('genre', )
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'batch', 'similar',
+                           'facets'):
             return TitleSerializer
         return TitlePostSerializer
 
     def perform_create(self, serializer):
         serializer.save()
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        """Возвращает произведения по списку id из параметра ids.
+
+        Порядок ответа совпадает с порядком id в запросе, отсутствующие
+        произведения пропускаются.
+        """
+        raw_ids = request.query_params.get('ids', '').split(',')
+        try:
+            ids = [int(pk) for pk in raw_ids if pk]
+        except ValueError:
+            raise ValidationError(
+                {'ids': 'Ожидается список id через запятую.'}
+            )
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > settings.TITLES_BATCH_LIMIT:
+            raise ValidationError({
+                'ids': 'Не больше {} произведений в запросе.'.format(
+                    settings.TITLES_BATCH_LIMIT
+                )
+            })
+        return self.ordered_response(ids)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Число произведений по жанрам, категориям и периодам лет.
+
+        Учитываются те же фильтры, что и в списке произведений.
+        """
+        queryset = self.filter_queryset(self.base_queryset.all())
+        return Response(get_facets(request.query_params, queryset))
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Похожие произведения из списка, рассчитанного заранее."""
+        ids = SimilarTitle.objects.filter(
+            title=self.get_object()
+        ).values_list('similar_id', flat=True)
+        return self.ordered_response(list(ids))
+
+    def ordered_response(self, ids):
+        titles = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [titles[pk] for pk in ids if pk in titles],
+            many=True
+        )
+        return Response(serializer.data)
+
+
+class BulkCreateView(GenericAPIView):
+    """Массовое создание объектов администратором.
+
+    Элементы проверяются сериализатором по одному без запросов к базе,
+    внешние ключи разрешаются в resolve() одним запросом на модель для
+    всей пачки, прошедшие проверку объекты вставляются bulk_create в одной
+    транзакции. В ответе для каждого элемента в порядке запроса
+    возвращается id созданного объекта или ошибки.
+    """
+
+    permission_classes = [IsAuthenticated & IsAdmin]
+    conflict_message = ('Данные изменились во время загрузки, повторите '
+                        'запрос.')
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError(
+                {'non_field_errors': ['Ожидается список объектов.']}
+            )
+        if len(items) > settings.BULK_CREATE_LIMIT:
+            raise ValidationError({'non_field_errors': [
+                'Не больше {} объектов в запросе.'.format(
+                    settings.BULK_CREATE_LIMIT
+                )
+            ]})
+
+        results = [None] * len(items)
+        valid = self.validate_items(items, results)
+        if valid:
+            try:
+                with transaction.atomic():
+                    objs = self.perform_bulk_create(
+                        [data for _, data in valid]
+                    )
+            except IntegrityError:
+                raise ValidationError(
+                    {'non_field_errors': [self.conflict_message]}
+                )
+            for (index, _), obj in zip(valid, objs):
+                results[index] = {'id': obj.pk}
+            purge_paths(self.get_purge_paths(objs))
+
+        created = len(valid)
+        if created == len(items):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {'created': created, 'failed': len(items) - created,
+             'results': results},
+            status=response_status
+        )
+
+    def validate_items(self, items, results):
+        """Возвращает пары (индекс, validated_data) корректных элементов.
+
+        Ошибки остальных элементов записываются в results.
+        """
+        valid = []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'errors': serializer.errors}
+        errors = self.resolve(valid)
+        for index, item_errors in errors.items():
+            results[index] = {'errors': item_errors}
+        return [(index, data) for index, data in valid if index not in errors]
+
+    def resolve(self, items):
+        """Проверяет связи пачки, возвращает {индекс: ошибки}.
+
+        items - пары (индекс, validated_data), validated_data можно
+        дополнять найденными объектами.
+        """
+        return {}
+
+    def perform_bulk_create(self, items):
+        raise NotImplementedError(
+            '.perform_bulk_create() must be overridden'
+        )
+
+    def get_purge_paths(self, objs):
+        return []
+
+
+class TitleBulkCreate(BulkCreateView):
+    """Массовое создание произведений, жанры и категория по slug."""
+
+    serializer_class = TitlePostSerializer
+
+    def perform_bulk_create(self, items):
+        titles = []
+        genres = []
+        for data in items:
+            data = dict(data)
+            genres.append(data.pop('genre', []))
+            titles.append(Title(**data))
+        # bulk_create не отправляет сигналов, которые сбрасывают фасеты.
+        invalidate_facets()
+        return create_titles(titles, genres)
+
+    def get_purge_paths(self, objs):
+        return [reverse('titles-list')]
+
+
+class ReviewBulkCreate(BulkCreateView):
+    """Массовое создание отзывов: произведение по id, автор по username."""
+
+    serializer_class = BulkReviewSerializer
+
+    def resolve(self, items):
+        title_ids = set(Title.objects.filter(
+            pk__in={data['title'] for _, data in items},
+            deleted_at__isnull=True
+        ).values_list('pk', flat=True))
+        authors = User.objects.filter(
+            username__in={data['author'] for _, data in items},
+            deleted_at__isnull=True
+        ).only('pk', 'username').in_bulk(field_name='username')
+        taken = set(Review.objects.filter(
+            title_id__in=title_ids,
+            author_id__in=[author.pk for author in authors.values()]
+        ).values_list('title_id', 'author_id'))
+
+        errors = {}
+        for index, data in items:
+            author = authors.get(data['author'])
+            if data['title'] not in title_ids:
+                errors[index] = {'title': [
+                    'Произведение {} не найдено.'.format(data['title'])
+                ]}
+            elif author is None:
+                errors[index] = {'author': [
+                    'Пользователь {} не найден.'.format(data['author'])
+                ]}
+            elif (data['title'], author.pk) in taken:
+                errors[index] = {
+                    'non_field_errors': [ReviewSerializer.duplicate_message]
+                }
+            else:
+                taken.add((data['title'], author.pk))
+                data['author'] = author
+        return errors
+
+    def perform_bulk_create(self, items):
+        reviews = create_reviews([
+            Review(
+                title_id=data['title'],
+                author=data['author'],
+                text=data['text'],
+                score=data['score']
+            )
+            for data in items
+        ])
+        ActivityEvent.objects.bulk_create([
+            make_event(ActivityEvent.REVIEW, ReviewSerializer(review).data,
+                       review.title_id)
+            for review in reviews
+        ])
+        return reviews
+
+    def get_purge_paths(self, objs):
+        paths = [reverse('titles-list')]
+        for title_id in {review.title_id for review in objs}:
+            paths += [
+                reverse('titles-detail', args=[title_id]),
+                reverse('reviews-list', kwargs={'title_id': title_id}),
+            ]
+        return paths
+
+
+class CommentBulkCreate(BulkCreateView):
+    """Массовое создание комментариев: отзыв по id, автор по username."""
+
+    serializer_class = BulkCommentSerializer
+
+    def resolve(self, items):
+        self.review_titles = dict(Review.objects.filter(
+            pk__in={data['review'] for _, data in items},
+            title__deleted_at__isnull=True
+        ).values_list('pk', 'title_id'))
+        authors = User.objects.filter(
+            username__in={data['author'] for _, data in items},
+            deleted_at__isnull=True
+        ).only('pk', 'username').in_bulk(field_name='username')
+
+        errors = {}
+        for index, data in items:
+            author = authors.get(data['author'])
+            if data['review'] not in self.review_titles:
+                errors[index] = {'review': [
+                    'Отзыв {} не найден.'.format(data['review'])
+                ]}
+            elif author is None:
+                errors[index] = {'author': [
+                    'Пользователь {} не найден.'.format(data['author'])
+                ]}
+            else:
+                data['author'] = author
+        return errors
+
+    def perform_bulk_create(self, items):
+        comments = create_comments([
+            Comment(
+                review_id=data['review'],
+                author=data['author'],
+                text=data['text']
+            )
+            for data in items
+        ])
+        ActivityEvent.objects.bulk_create([
+            make_event(ActivityEvent.COMMENT, CommentSerializer(comment).data,
+                       self.review_titles[comment.review_id],
+                       comment.review_id)
+            for comment in comments
+        ])
+        return comments
+
+    def get_purge_paths(self, objs):
+        return [
+            reverse('comments-list', kwargs={
+                'title_id': self.review_titles[review_id],
+                'review_id': review_id
+            })
+            for review_id in {comment.review_id for comment in objs}
+        ]
+
+
+class ModerationDeleteView(GenericAPIView):
+    """Массовое удаление отзывов и комментариев модератором.
+
+    Права проверяются один раз на весь запрос, отзывы и комментарии
+    удаляются set-based запросами reviews.moderation в одной транзакции
+    вместе с их событиями журнала, счетчики и рейтинг затронутых
+    произведений пересчитываются там же, а пути в кэше прокси обновляет
+    обработчик сигнала rows_deleted.
+    """
+
+    permission_classes = [IsAuthenticated & (IsModerator | IsAdmin)]
+    serializer_class = ModerationDeleteSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reviews, comments = self.get_querysets(serializer.validated_data)
+        with transaction.atomic():
+            deleted_comments = delete_comments(comments)
+            deleted_reviews, cascaded = delete_reviews(reviews)
+        return Response({
+            'reviews': deleted_reviews,
+            'comments': deleted_comments + cascaded,
+        })
+
+    @staticmethod
+    def get_querysets(data):
+        filters = {}
+        if 'author' in data:
+            filters['author'] = data['author']
+        if 'since' in data:
+            filters['pub_date__gte'] = data['since']
+        if 'until' in data:
+            filters['pub_date__lte'] = data['until']
+        # Если переданы id, удаляются только наборы с id: автор и период
+        # их сужают. Без id удаляются и отзывы, и комментарии автора.
+        names = {'reviews', 'comments'} & data.keys()
+        if not names:
+            names = {'reviews', 'comments'}
+        querysets = []
+        for name, model in (('reviews', Review), ('comments', Comment)):
+            queryset = model.objects.filter(**filters)
+            if name not in names:
+                queryset = queryset.none()
+            elif name in data:
+                queryset = queryset.filter(pk__in=data[name])
+            querysets.append(queryset)
+        return querysets
+
+
+class MemoryDiagnostics(APIView):
+    """Память воркера, обработавшего запрос, по снимкам tracemalloc.
+
+    POST перед отчетом делает новый снимок. Рост памяти отдается по
+    модулям, где она выделена, относительно предыдущего и самого старого
+    из хранимых снимков.
+    """
+
+    permission_classes = [IsAuthenticated & IsAdmin]
+
+    def get(self, request):
+        return Response(self.report())
+
+    def post(self, request):
+        if tracker.enabled:
+            tracker.take('request')
+        return Response(self.report())
+
+    @staticmethod
+    def report():
+        if not tracker.enabled:
+            raise NotFound('Профилирование памяти выключено.')
+        return tracker.report()
@@ -32,7 +32,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.shedding.LoadSheddingMiddleware',
+    'core.profiler.ProfilerMiddleware',
+    'core.querylog.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.JSONGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -132,6 +136,200 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'PAGE_SIZE': 4,
+
+    # Адрес клиента для ограничений по IP берется из X-Forwarded-For,
+    # который выставляет nginx перед приложением.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default='1')),
+    'DEFAULT_THROTTLE_RATES': {
+        'signup': os.getenv('THROTTLE_SIGNUP', default='20/hour'),
+        'signup_credentials': os.getenv(
+            'THROTTLE_SIGNUP_CREDENTIALS', default='5/hour'
+        ),
+        'token': os.getenv('THROTTLE_TOKEN', default='60/hour'),
+        'token_credentials': os.getenv(
+            'THROTTLE_TOKEN_CREDENTIALS', default='10/hour'
+        ),
+        'content_create_user': os.getenv(
+            'THROTTLE_CONTENT_CREATE_USER', default='30/min'
+        ),
+        'content_create_moderator': os.getenv(
+            'THROTTLE_CONTENT_CREATE_MODERATOR', default='120/min'
+        ),
+    },
+}
+
+# Наибольший размер страницы, который клиент может запросить параметром
+# page_size, если вьюсет не задает свой max_page_size.
+MAX_PAGE_SIZE = 100
+
+# JSON-ответы короче этого числа байт отдаются без сжатия.
+GZIP_MIN_LENGTH = 1024
+
+# Удаление произведений и пользователей через API только помечает их
+# удаленными, связанные отзывы и комментарии удаляет пачками команда
+# purge_deleted. Режим включен по умолчанию, а purge_deleted нигде не
+# запускается по расписанию (ни в infra, ни в контейнере): без cron или
+# другого планировщика строки удаленных объектов копятся в базе.
+# Удаленные пользователи неактивны: signup не шлет им код, а get_token
+# отвечает 404.
+SOFT_DELETE = os.getenv('SOFT_DELETE', default='True') == 'True'
+
+# Выше этого числа строк (по оценке планировщика PostgreSQL) постраничные
+# списки показывают приблизительный count вместо COUNT(*).
+EXACT_COUNT_THRESHOLD = 10000
+
+# Наибольшее число произведений в одном запросе /titles/batch/.
+TITLES_BATCH_LIMIT = 100
+
+# Наибольшее число объектов в одном запросе к /bulk/.
+BULK_CREATE_LIMIT = int(os.getenv('BULK_CREATE_LIMIT', default='500'))
+
+# Наибольшее число id отзывов или комментариев в одном запросе к
+# /moderation/delete/.
+MODERATION_IDS_LIMIT = 1000
+
+# Потоки событий /events/: период опроса журнала фоновым потоком воркера,
+# интервал keepalive-комментариев, сколько пропущенных событий отдавать по
+# Last-Event-ID и сколько хранить журнал. EVENTS_GAP_TIMEOUT - сколько
+# секунд ждать событие с пропущенным id, пока его транзакция не
+# зафиксирована; события с большими id все это время не раздаются.
+EVENTS_POLL_INTERVAL = 1.0
+EVENTS_GAP_TIMEOUT = 10
+# Каждый открытый поток занимает поток воркера (--threads 32 в образе), так
+# что потоков событий на воркер не больше EVENTS_MAX_SUBSCRIBERS; сверх
+# лимита - 503 с Retry-After. Открытые потоки считаются в
+# SHED_MAX_IN_FLIGHT.
+EVENTS_MAX_SUBSCRIBERS = int(
+    os.getenv('EVENTS_MAX_SUBSCRIBERS', default='8')
+)
+EVENTS_KEEPALIVE = 15
+EVENTS_BACKLOG_LIMIT = 100
+EVENTS_RETENTION = timedelta(days=1)
+
+# Как часто (в секундах) воркер сверяет версию своего снимка категорий и
+# жанров с базой; изменения из других воркеров видны с этой задержкой.
+CATALOG_CHECK_INTERVAL = float(
+    os.getenv('CATALOG_CHECK_INTERVAL', default='1')
+)
+
+# Одновременные одинаковые GET-запросы к произведениям, отзывам и
+# комментариям выполняются один раз, остальные ждут результат не дольше
+# SINGLE_FLIGHT_TIMEOUT секунд. SINGLE_FLIGHT_SHARED объединяет запросы и
+# между воркерами через блокировку в кэше (нужен общий бэкенд CACHES),
+# результат хранится там SINGLE_FLIGHT_RESULT_TTL секунд.
+SINGLE_FLIGHT = os.getenv('SINGLE_FLIGHT', default='True') == 'True'
+SINGLE_FLIGHT_SHARED = (
+    os.getenv('SINGLE_FLIGHT_SHARED', default='False') == 'True'
+)
+SINGLE_FLIGHT_TIMEOUT = 5
+SINGLE_FLIGHT_RESULT_TTL = 2
+SINGLE_FLIGHT_POLL_INTERVAL = 0.02
+
+# Журнал медленных запросов: каждый SQL-запрос относится к обработчику
+# (TitleViewSet.list, signup), запросы дольше SLOW_QUERY_MS миллисекунд
+# пишутся в лог с планом и местом вызова. QUERY_BUDGETS ограничивают число
+# запросов на обработчик; при QUERY_BUDGETS_STRICT превышение - ошибка
+# (включается в тестах).
+QUERY_LOG = os.getenv('QUERY_LOG', default='False') == 'True'
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', default='100'))
+QUERY_BUDGETS_STRICT = (
+    os.getenv('QUERY_BUDGETS_STRICT', default='False') == 'True'
+)
+# Бюджеты даны для аутентифицированного запроса на PostgreSQL (с оценкой
+# count через EXPLAIN) с холодными кэшами: список, фасеты, создание и
+# изменение произведения после правки категорий или жанров еще читают
+# справочники для снимка, а список собирает карточки. В запросы на запись
+# входят SAVEPOINT и RELEASE вложенных транзакций, изменение произведения
+# считается со сменой жанров. tests/test_query_budgets.py проверяет каждый
+# бюджет на холодных и прогретых кэшах.
+QUERY_BUDGETS = {
+    'TitleViewSet.list': 8,
+    'TitleViewSet.retrieve': 3,
+    'TitleViewSet.batch': 3,
+    'TitleViewSet.similar': 6,
+    'TitleViewSet.facets': 7,
+    'TitleViewSet.create': 9,
+    'TitleViewSet.partial_update': 13,
+    'ReviewViewSet.list': 5,
+    'ReviewViewSet.retrieve': 4,
+    'ReviewViewSet.create': 9,
+    'CommentViewSet.list': 5,
+    'CommentViewSet.retrieve': 5,
+    'CommentViewSet.create': 8,
+    'CategoryViewSet.list': 4,
+    'GenreViewSet.list': 4,
+    'UserMeActivity.get': 3,
+    'UserViewSet.activity': 4,
+    'signup.post': 2,
+    'get_token.post': 1,
+}
+
+# Профилирование запроса администратором по заголовку X-Profile или
+# параметру ?_profile= (text или pstats). Выключено по умолчанию; дампы
+# pstats сохраняются в PROFILER_DIR, если он задан.
+PROFILER = os.getenv('PROFILER', default='False') == 'True'
+PROFILER_DIR = os.getenv('PROFILER_DIR', default='')
+PROFILER_TOP = 40
+
+# Список /titles/ собирается из JSON-карточек произведений, хранящихся в
+# кэше TITLE_CARD_TTL секунд.
+TITLE_CARDS = os.getenv('TITLE_CARDS', default='True') == 'True'
+TITLE_CARD_TTL = 60 * 60 * 24
+
+# Фасеты /titles/facets/ кэшируются на TITLE_FACETS_TTL секунд и
+# сбрасываются при изменении произведений; годы группируются по
+# TITLE_FACETS_YEAR_BUCKET лет.
+TITLE_FACETS_TTL = 60 * 10
+TITLE_FACETS_YEAR_BUCKET = 10
+
+# Отказ 503 при перегрузке воркера: по числу запросов в обработке и по
+# времени ожидания в очереди (секунды, от заголовка X-Request-Start).
+# Изменяющим запросам доступно на SHED_RESERVED_IN_FLIGHT мест меньше и
+# у них ниже порог задержки; запросы администраторов не отклоняются.
+# Число запросов учитывается только в многопоточном воркере (в образе
+# gthread с --threads 32) и должно быть меньше числа потоков.
+LOAD_SHEDDING = os.getenv('LOAD_SHEDDING', default='True') == 'True'
+SHED_MAX_IN_FLIGHT = int(os.getenv('SHED_MAX_IN_FLIGHT', default='24'))
+SHED_RESERVED_IN_FLIGHT = int(
+    os.getenv('SHED_RESERVED_IN_FLIGHT', default='8')
+)
+SHED_READ_QUEUE_LATENCY = float(
+    os.getenv('SHED_READ_QUEUE_LATENCY', default='2')
+)
+SHED_WRITE_QUEUE_LATENCY = float(
+    os.getenv('SHED_WRITE_QUEUE_LATENCY', default='0.5')
+)
+SHED_RETRY_AFTER = 5
+
+# Снимки памяти воркера через tracemalloc: раз в MEMORY_SNAPSHOT_INTERVAL
+# секунд (0 - только по сигналу SIGUSR2 и запросу к
+# /diagnostics/memory/), в памяти хранятся MEMORY_SNAPSHOTS последних.
+# Выключено по умолчанию: трассировка замедляет выделение памяти.
+MEMORY_PROFILER = os.getenv('MEMORY_PROFILER', default='False') == 'True'
+MEMORY_TRACE_FRAMES = int(os.getenv('MEMORY_TRACE_FRAMES', default='1'))
+MEMORY_SNAPSHOT_INTERVAL = int(
+    os.getenv('MEMORY_SNAPSHOT_INTERVAL', default='0')
+)
+MEMORY_SNAPSHOTS = 3
+MEMORY_REPORT_TOP = 20
+
+# Сброс кэша nginx после изменения данных: HttpRefreshPurger обращается к
+# служебному порту nginx по адресу CACHE_PURGE_URL, LocalPurger только
+# запоминает пути.
+CACHE_PURGER = os.getenv('CACHE_PURGER', default='core.cache_purge.LocalPurger')
+CACHE_PURGE_URL = os.getenv('CACHE_PURGE_URL', default='http://nginx:8080')
+CACHE_PURGE_HOST = os.getenv('CACHE_PURGE_HOST', default='127.0.0.1')
+
+# Корзины ограничения частоты запросов хранятся в кэше, для общего лимита
+# на все воркеры нужен общий бэкенд (memcached, база данных).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
 }
 
 
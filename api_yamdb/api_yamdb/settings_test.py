@@ -0,0 +1,9 @@
+"""Настройки для pytest: база SQLite в памяти вместо PostgreSQL."""
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
@@ -0,0 +1,78 @@
+"""Сброс ответов, закэшированных nginx, после изменения данных.
+
+nginx без стороннего модуля не умеет удалять записи кэша, поэтому
+используется обновление: служебный порт nginx (не опубликованный наружу)
+всегда идет за ответом в приложение и перезаписывает им кэш. Списки с
+параметрами запроса (страницы, фильтры) по одному не обновляются и
+устаревают по proxy_cache_valid. После удаления объекта обновление
+получает 404, который nginx тоже кэширует, заменяя им прежний ответ.
+"""
+import logging
+from functools import lru_cache
+from queue import Queue
+from threading import Lock, Thread
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class LocalPurger:
+    """Запоминает пути вместо обращения к прокси (для разработки и тестов)."""
+
+    def __init__(self):
+        self.purged = []
+
+    def purge(self, paths):
+        self.purged.extend(paths)
+
+
+class HttpRefreshPurger:
+    """Запрашивает пути у служебного порта nginx из фонового потока."""
+
+    timeout = 2
+
+    def __init__(self):
+        self.queue = Queue()
+        self.lock = Lock()
+        self.thread = None
+
+    def purge(self, paths):
+        with self.lock:
+            if self.thread is None:
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+        for path in paths:
+            self.queue.put(path)
+
+    def refresh(self, path):
+        # Ссылки next/previous в ответе строятся по Host, поэтому запрос
+        # идет с публичным именем сайта, а не с адресом служебного порта.
+        request = Request(
+            settings.CACHE_PURGE_URL + path, method='GET',
+            headers={'Host': settings.CACHE_PURGE_HOST}
+        )
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except (URLError, OSError):
+            logger.warning('Failed to refresh cached %s', path)
+
+    def run(self):
+        while True:
+            self.refresh(self.queue.get())
+
+
+@lru_cache(maxsize=None)
+def get_purger():
+    return import_string(settings.CACHE_PURGER)()
+
+
+def purge_paths(paths):
+    """Обновляет пути в кэше прокси после коммита текущей транзакции."""
+    paths = sorted(set(paths))
+    transaction.on_commit(lambda: get_purger().purge(paths))
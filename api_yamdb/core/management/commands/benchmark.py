@@ -0,0 +1,366 @@
+import gc
+import time
+import tracemalloc
+from threading import Barrier, Thread
+
+from core.memory import format_stats, module_stats, take_snapshot
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.handlers.base import BaseHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+from reviews.models import Category, Comment, Genre, Review, Title
+from users.models import User
+
+ROW = '{:<32} {:>8} {:>10} {:>12} {:>8}'
+HEADER = ('measurement', 'objects', 'seconds', 'objects/s', 'queries')
+MEMORY_ROW = '{:<32} {:>8} {:>14} {:>12}'
+MEMORY_HEADER = ('measurement', 'requests', 'growth, bytes', 'bytes/req')
+
+
+class Command(BaseCommand):
+    """Замеры производительности API на настроенной базе.
+
+    Сценарий - метод scenario_<имя>. Каждый сценарий выполняется в
+    транзакции, которая в конце откатывается, поэтому созданные данные в
+    базе не остаются, а отложенные до коммита действия (сброс кэша nginx)
+    не выполняются.
+    """
+
+    help = ('Run API benchmark scenarios against the configured database, '
+            'rolling back everything they create')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*',
+            help='Scenarios to run ({}), all by default'.format(
+                ', '.join(self.get_scenarios())
+            )
+        )
+        parser.add_argument(
+            '--count', type=int, default=200,
+            help='Number of objects or requests per measurement'
+        )
+
+    @classmethod
+    def get_scenarios(cls):
+        prefix = 'scenario_'
+        return sorted(
+            name[len(prefix):] for name in dir(cls) if name.startswith(prefix)
+        )
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or self.get_scenarios()
+        unknown = set(names) - set(self.get_scenarios())
+        if unknown:
+            raise CommandError(
+                'Unknown scenarios: {}'.format(', '.join(sorted(unknown)))
+            )
+        self.count = options['count']
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for name in names:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.header = None
+                with transaction.atomic():
+                    getattr(self, 'scenario_' + name)()
+                    transaction.set_rollback(True)
+
+    @staticmethod
+    def make_user(username, role=User.USER):
+        return User.objects.create(
+            username=username,
+            email='{}@benchmark.local'.format(username),
+            role=role
+        )
+
+    @staticmethod
+    def client_for(user):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION='Bearer {}'.format(AccessToken.for_user(user))
+        )
+        return client
+
+    @staticmethod
+    def expect(response, *statuses):
+        if response.status_code not in statuses:
+            raise CommandError('Unexpected response {}: {}'.format(
+                response.status_code, response.content[:500]
+            ))
+        return response
+
+    def measure(self, label, objects, func):
+        """Выполняет func и печатает время, пропускную способность и
+        число запросов к базе.
+
+        func может вернуть число запросов, выполненных в других потоках.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            other_queries = func()
+            elapsed = time.perf_counter() - started
+        if not isinstance(other_queries, int):
+            other_queries = 0
+        self.write_row(ROW, HEADER, (
+            label, objects, '{:.3f}'.format(elapsed),
+            '{:.1f}'.format(objects / elapsed if elapsed else 0),
+            len(queries) + other_queries
+        ))
+
+    def write_row(self, row, header, values):
+        """Печатает строку таблицы, а перед первой строкой - заголовок."""
+        if self.header != header:
+            self.header = header
+            self.stdout.write(row.format(*header))
+        self.stdout.write(row.format(*values))
+
+    def burst(self, paths):
+        """Выполняет GET по всем путям одновременно, по потоку на запрос.
+
+        Возвращает суммарное число запросов к базе.
+        """
+        barrier = Barrier(len(paths))
+        counts = []
+        errors = []
+
+        def worker(path):
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    barrier.wait()
+                    self.expect(APIClient().get(path), 200)
+                counts.append(len(queries))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [Thread(target=worker, args=(path, )) for path in paths]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return sum(counts)
+
+    @staticmethod
+    def address(number):
+        """Отдельный адрес клиента для каждого запроса, чтобы не
+        срабатывали ограничения частоты по IP."""
+        return '10.{}.{}.{}'.format(
+            number >> 16 & 255, number >> 8 & 255, number & 255
+        )
+
+    def post_single(self, client, path, items):
+        for item in items:
+            self.expect(client.post(path, item, format='json'), 201)
+
+    def post_bulk(self, client, path, items):
+        limit = settings.BULK_CREATE_LIMIT
+        for start in range(0, len(items), limit):
+            self.expect(
+                client.post(path, items[start:start + limit], format='json'),
+                201
+            )
+
+    def scenario_bulk(self):
+        """Создание произведений, отзывов и комментариев по одному POST и
+        через /bulk/."""
+        admin = self.make_user('benchmark_admin', User.ADMIN)
+        author = self.make_user('benchmark_author')
+        client = self.client_for(admin)
+        count = self.count
+
+        titles = [
+            {'name': 'Benchmark {}'.format(i), 'year': 2000}
+            for i in range(count)
+        ]
+        self.measure('titles: single POST', count, lambda: self.post_single(
+            client, reverse('titles-list'), titles
+        ))
+        self.measure('titles: bulk', count, lambda: self.post_bulk(
+            client, reverse('bulk-titles'), titles
+        ))
+
+        title_ids = list(Title.objects.filter(
+            name__startswith='Benchmark '
+        ).values_list('pk', flat=True)[:count])
+        self.measure('reviews: single POST', count, lambda: [
+            self.expect(client.post(
+                reverse('reviews-list', kwargs={'title_id': title_id}),
+                {'text': 'Benchmark', 'score': 5}, format='json'
+            ), 201)
+            for title_id in title_ids
+        ])
+        self.measure('reviews: bulk', count, lambda: self.post_bulk(
+            client, reverse('bulk-reviews'), [
+                {'title': title_id, 'author': author.username,
+                 'text': 'Benchmark', 'score': 5}
+                for title_id in title_ids
+            ]
+        ))
+
+        review = Review.objects.filter(author=admin).first()
+        comments_path = reverse('comments-list', kwargs={
+            'title_id': review.title_id, 'review_id': review.pk
+        })
+        self.measure('comments: single POST', count, lambda: (
+            self.post_single(client, comments_path, [
+                {'text': 'Benchmark {}'.format(i)} for i in range(count)
+            ])
+        ))
+        self.measure('comments: bulk', count, lambda: self.post_bulk(
+            client, reverse('bulk-comments'), [
+                {'review': review.pk, 'author': author.username,
+                 'text': 'Benchmark {}'.format(i)}
+                for i in range(count)
+            ]
+        ))
+
+    def scenario_burst(self):
+        """Всплеск одновременных GET к произведению с наибольшим числом
+        отзывов и к его отзывам, без объединения запросов и с ним.
+
+        Читает существующие данные: потоки работают в своих соединениях и
+        не видят незакоммиченных объектов сценария.
+        """
+        title = Title.objects.filter(
+            deleted_at__isnull=True
+        ).order_by('-review_count').first()
+        if title is None:
+            raise CommandError(
+                'The burst scenario needs at least one title in the database.'
+            )
+        paths = [
+            reverse('titles-detail', args=[title.pk]),
+            reverse('reviews-list', kwargs={'title_id': title.pk}),
+        ] * max(self.count // 2, 1)
+        for label, enabled in (('burst: no coalescing', False),
+                               ('burst: single-flight', True)):
+            with override_settings(SINGLE_FLIGHT=enabled):
+                self.measure(label, len(paths), lambda: self.burst(paths))
+
+    def scenario_auth(self):
+        """Регистрация, повторный запрос кода и получение токена.
+
+        Каждый запрос идет со своего адреса и со своими учетными данными,
+        письма не отправляются.
+        """
+        client = APIClient()
+        count = self.count
+        users = [
+            {'username': 'benchmark_auth_{}'.format(i),
+             'email': 'benchmark_auth_{}@benchmark.local'.format(i)}
+            for i in range(count)
+        ]
+
+        def signup(offset):
+            for i, data in enumerate(users):
+                self.expect(client.post(
+                    reverse('signup'), data, format='json',
+                    REMOTE_ADDR=self.address(offset + i)
+                ), 200)
+
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'
+        ):
+            self.measure('signup: new user', count, lambda: signup(0))
+            self.measure('signup: existing user', count,
+                         lambda: signup(count))
+
+        codes = [
+            (user.username, default_token_generator.make_token(user))
+            for user in User.objects.filter(
+                username__in=[data['username'] for data in users]
+            )
+        ]
+        self.measure('token', count, lambda: [
+            self.expect(client.post(
+                reverse('token'),
+                {'username': username, 'confirmation_code': code},
+                format='json', REMOTE_ADDR=self.address(2 * count + i)
+            ), 200)
+            for i, (username, code) in enumerate(codes)
+        ])
+
+    def scenario_memory(self):
+        """Рост памяти на запрос для набора GET-запросов к API.
+
+        Каждый путь прогревается, затем выполняется count раз между двумя
+        снимками tracemalloc. В рост входит и заполнение кэшей (карточки,
+        фасеты), ограниченное их TTL. В конце печатаются модули, где
+        выделена оставшаяся после всего набора память.
+        """
+        admin = self.make_user('benchmark_admin', User.ADMIN)
+        auth = 'Bearer {}'.format(AccessToken.for_user(admin))
+        # django.test.Client на каждый запрос заново подключает обработчик
+        # к request_finished и оставляет в памяти запись weakref.finalize,
+        # поэтому запросы передаются обработчику Django напрямую.
+        handler = BaseHandler()
+        handler.load_middleware()
+        factory = APIRequestFactory()
+
+        def get(path):
+            self.expect(handler.get_response(
+                factory.get(path, HTTP_AUTHORIZATION=auth)
+            ), 200)
+
+        category = Category.objects.create(
+            name='Benchmark', slug='benchmark-memory'
+        )
+        genre = Genre.objects.create(name='Benchmark', slug='benchmark-memory')
+        title = Title.objects.create(
+            name='Benchmark', year=2000, category=category
+        )
+        title.genre.add(genre)
+        review = Review.objects.create(
+            title=title, author=admin, text='Benchmark', score=5
+        )
+        Comment.objects.create(review=review, author=admin, text='Benchmark')
+        review_kwargs = {'title_id': title.pk, 'review_id': review.pk}
+        paths = [
+            ('titles: list', reverse('titles-list')),
+            ('titles: detail', reverse('titles-detail', args=[title.pk])),
+            ('titles: facets', reverse('titles-facets')),
+            ('reviews: list', reverse(
+                'reviews-list', kwargs={'title_id': title.pk}
+            )),
+            ('comments: list', reverse('comments-list', kwargs=review_kwargs)),
+            ('categories: list', reverse('categories-list')),
+            ('genres: list', reverse('genres-list')),
+            ('users: me', reverse('profile')),
+        ]
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+        try:
+            first = None
+            for label, path in paths:
+                for _ in range(10):
+                    get(path)
+                gc.collect()
+                before = take_snapshot()
+                first = first or before
+                for _ in range(self.count):
+                    get(path)
+                gc.collect()
+                growth = sum(
+                    stat.size_diff
+                    for stat in take_snapshot().compare_to(before, 'filename')
+                )
+                self.write_row(MEMORY_ROW, MEMORY_HEADER, (
+                    label, self.count, growth,
+                    '{:.1f}'.format(growth / self.count)
+                ))
+            self.stdout.write('\nTop allocation sites by module:')
+            self.stdout.write(format_stats(
+                module_stats(take_snapshot(), first, 15)
+            ))
+        finally:
+            if not tracing:
+                tracemalloc.stop()
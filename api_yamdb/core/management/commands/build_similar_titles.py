@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from reviews.models import Title
+from reviews.similarity import build_similar_titles
+
+
+class Command(BaseCommand):
+    help = ('Compute "similar titles" neighbour lists from review scores; '
+            'by default only for titles whose reviews changed since the '
+            'last run')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recompute neighbours for every title'
+        )
+        parser.add_argument('--top-k', type=int, default=10)
+        parser.add_argument(
+            '--min-common', type=int, default=2,
+            help='Minimum number of reviewers two titles must share'
+        )
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        titles = Title.objects.filter(deleted_at__isnull=True)
+        if not options['full']:
+            titles = titles.filter(
+                Q(similar_computed_at__isnull=True,
+                  reviews_changed_at__isnull=False)
+                | Q(reviews_changed_at__gt=F('similar_computed_at'))
+            )
+
+        def progress(done, total):
+            self.stdout.write('{}/{} titles processed'.format(done, total))
+
+        processed = build_similar_titles(
+            titles.order_by('pk').values_list('pk', flat=True),
+            top_k=options['top_k'],
+            min_common=options['min_common'],
+            chunk_size=options['chunk_size'],
+            progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Similar titles computed for {} titles'.format(processed)
+        ))
@@ -0,0 +1,252 @@
+import datetime as dt
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from reviews.models import Comment
+
+PARTITION_NAME = '{table}_y{year:04d}m{month:02d}'
+
+
+def month_start(date):
+    return dt.date(date.year, date.month, 1)
+
+
+def next_month(date):
+    if date.month == 12:
+        return dt.date(date.year + 1, 1, 1)
+    return dt.date(date.year, date.month + 1, 1)
+
+
+class Command(BaseCommand):
+    """Помесячное партиционирование таблицы комментариев по pub_date.
+
+    Партиционируется только Comment. Отзывы остаются обычной таблицей:
+    PostgreSQL требует, чтобы ключ партиционирования входил в каждый
+    уникальный ключ, и тогда ни unique_review (author, title), ни внешний
+    ключ Comment.review на Review.id работать не смогут.
+    """
+
+    help = ('Convert the comments table to monthly range partitions by '
+            'pub_date, create future partitions, detach old ones and report '
+            'partition sizes (PostgreSQL only)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--setup', action='store_true',
+            help='Convert the existing table into a partitioned one'
+        )
+        parser.add_argument(
+            '--ahead', type=int, default=3,
+            help='Number of future monthly partitions to keep created'
+        )
+        parser.add_argument(
+            '--detach-before', type=dt.date.fromisoformat,
+            help='Detach (archive) partitions ending on or before this date'
+        )
+        parser.add_argument(
+            '--report', action='store_true',
+            help='Print row estimates and table/index sizes per partition'
+        )
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help='With --report, time VACUUM ANALYZE of each partition'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning requires PostgreSQL.')
+        self.table = Comment._meta.db_table
+
+        with connection.cursor() as cursor:
+            self.cursor = cursor
+            if options['setup']:
+                self.setup()
+            elif not self.is_partitioned():
+                raise CommandError(
+                    'Table {} is not partitioned, run with --setup '
+                    'first.'.format(self.table)
+                )
+            self.create_partitions(
+                month_start(timezone.now().date()), options['ahead']
+            )
+            if options['detach_before']:
+                self.detach_partitions(options['detach_before'])
+            if options['report']:
+                self.report(options['vacuum'])
+
+    def is_partitioned(self):
+        self.cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = %s::regclass',
+            [self.table]
+        )
+        return self.cursor.fetchone()[0] == 'p'
+
+    def partitions(self):
+        """Возвращает {имя: (начало, конец)} для подключенных партиций."""
+        self.cursor.execute(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+            [self.table]
+        )
+        result = {}
+        prefix = self.table + '_y'
+        for name, in self.cursor.fetchall():
+            if not name.startswith(prefix):
+                continue
+            start = dt.date(int(name[-7:-3]), int(name[-2:]), 1)
+            result[name] = start, next_month(start)
+        return result
+
+    def create_partition(self, start):
+        name = PARTITION_NAME.format(
+            table=self.table, year=start.year, month=start.month
+        )
+        self.cursor.execute(
+            'CREATE TABLE IF NOT EXISTS {} PARTITION OF {} '
+            'FOR VALUES FROM (%s) TO (%s)'.format(name, self.table),
+            [start.isoformat(), next_month(start).isoformat()]
+        )
+        return name
+
+    def create_partitions(self, start, ahead):
+        existing = self.partitions()
+        for _ in range(ahead + 1):
+            name = self.create_partition(start)
+            if name not in existing:
+                self.stdout.write('Created partition {}'.format(name))
+            start = next_month(start)
+
+    def execute_all(self, statements, names):
+        for statement in statements:
+            self.cursor.execute(statement.format(**names))
+
+    @transaction.atomic
+    def setup(self):
+        if self.is_partitioned():
+            raise CommandError(
+                'Table {} is already partitioned.'.format(self.table)
+            )
+        old = self.table + '_unpartitioned'
+        sequence = self.table + '_id_seq'
+        names = {
+            'table': self.table,
+            'old': old,
+            'sequence': sequence,
+            'review_table': Comment.review.field.related_model._meta.db_table,
+            'user_table': Comment.author.field.related_model._meta.db_table,
+        }
+        self.execute_all([
+            'ALTER TABLE {table} RENAME TO {old}',
+            'ALTER SEQUENCE {sequence} OWNED BY NONE',
+            'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE (pub_date)',
+            'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT',
+        ], names)
+
+        self.cursor.execute('SELECT min(pub_date) FROM {}'.format(old))
+        first = self.cursor.fetchone()[0]
+        last = month_start(timezone.now().date())
+        start = month_start(first.date()) if first is not None else last
+        while start <= last:
+            self.create_partition(start)
+            start = next_month(start)
+
+        # Индексы и ключи строятся после копирования данных: так быстрее,
+        # а имена индексов старой таблицы к этому моменту освобождены.
+        self.execute_all([
+            'INSERT INTO {table} SELECT * FROM {old}',
+            'DROP TABLE {old}',
+            'ALTER SEQUENCE {sequence} OWNED BY {table}.id',
+            'ALTER TABLE {table} ADD PRIMARY KEY (id, pub_date)',
+            'CREATE INDEX ON {table} (review_id)',
+            'CREATE INDEX ON {table} (pub_date)',
+            'CREATE INDEX comment_author_pub_date_idx '
+            'ON {table} (author_id, pub_date)',
+            'ALTER TABLE {table} ADD FOREIGN KEY (review_id) '
+            'REFERENCES {review_table} (id) DEFERRABLE INITIALLY DEFERRED',
+            'ALTER TABLE {table} ADD FOREIGN KEY (author_id) '
+            'REFERENCES {user_table} (id) DEFERRABLE INITIALLY DEFERRED',
+        ], names)
+        self.stdout.write(self.style.SUCCESS(
+            'Table {} converted to monthly partitions'.format(self.table)
+        ))
+
+    def drop_foreign_keys(self, name):
+        """Удаляет внешние ключи таблицы, возвращает их имена."""
+        self.cursor.execute(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [name]
+        )
+        constraints = [constraint for constraint, in self.cursor.fetchall()]
+        for constraint in constraints:
+            self.cursor.execute('ALTER TABLE {} DROP CONSTRAINT {}'.format(
+                name, connection.ops.quote_name(constraint)
+            ))
+        return constraints
+
+    @transaction.atomic
+    def detach_partition(self, name):
+        # Отключенная партиция сохраняет унаследованные внешние ключи на
+        # отзывы и пользователей уже как свои. Удаление Django их строк не
+        # видит, и жесткое удаление старых отзывов и пользователей
+        # (purge_deleted, модерация, каскад произведения) падало бы на
+        # коммите, поэтому архив отвязывается от живых таблиц.
+        self.cursor.execute(
+            'ALTER TABLE {} DETACH PARTITION {}'.format(self.table, name)
+        )
+        return self.drop_foreign_keys(name)
+
+    def archived(self):
+        """Имена ранее отключенных партиций, у которых остались ключи."""
+        self.cursor.execute(
+            "SELECT DISTINCT c.relname FROM pg_constraint k "
+            "JOIN pg_class c ON c.oid = k.conrelid "
+            "WHERE k.contype = 'f' AND c.relname LIKE %s "
+            "AND NOT c.relispartition",
+            [self.table + '\\_y%']
+        )
+        return [name for name, in self.cursor.fetchall()]
+
+    def detach_partitions(self, before):
+        # Архивы, отключенные прежними версиями команды, сохранили ключи.
+        for name in self.archived():
+            with transaction.atomic():
+                self.drop_foreign_keys(name)
+            self.stdout.write('Dropped foreign keys of archived {}'.format(
+                name
+            ))
+        for name, (start, end) in self.partitions().items():
+            if end <= before:
+                constraints = self.detach_partition(name)
+                self.stdout.write(
+                    'Detached partition {} ({} - {}), the table is kept '
+                    'for archiving without foreign keys ({})'.format(
+                        name, start, end, ', '.join(constraints) or 'none'
+                    )
+                )
+
+    def report(self, vacuum):
+        self.cursor.execute(
+            'SELECT c.relname, c.reltuples::bigint, '
+            'pg_table_size(c.oid), pg_indexes_size(c.oid) '
+            'FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = %s::regclass ORDER BY c.relname',
+            [self.table]
+        )
+        rows = self.cursor.fetchall()
+        self.stdout.write('{:<36} {:>12} {:>14} {:>14} {:>10}'.format(
+            'partition', 'rows', 'table bytes', 'index bytes', 'vacuum s'
+        ))
+        for name, tuples, table_size, index_size in rows:
+            elapsed = ''
+            if vacuum:
+                started = time.monotonic()
+                self.cursor.execute('VACUUM (ANALYZE) {}'.format(name))
+                elapsed = '{:.3f}'.format(time.monotonic() - started)
+            self.stdout.write('{:<36} {:>12} {:>14} {:>14} {:>10}'.format(
+                name, tuples, table_size, index_size, elapsed
+            ))
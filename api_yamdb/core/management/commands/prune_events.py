@@ -0,0 +1,9 @@
+from api.events import prune_events
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Delete activity events older than EVENTS_RETENTION'
+
+    def handle(self, *args, **options):
+        self.stdout.write('{} events deleted'.format(prune_events()))
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+from reviews.models import Comment, Review, Title
+from reviews.moderation import delete_comments, delete_reviews
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Delete soft-deleted titles and users together with their '
+            'reviews and comments in bounded batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between batches'
+        )
+
+    def purge(self, label, queryset, delete):
+        """Удаляет queryset пачками по batch_size строк.
+
+        delete получает пачку и возвращает число удаленных строк.
+        """
+        total = 0
+        while True:
+            ids = list(
+                queryset.order_by().values_list('pk', flat=True)[
+                    :self.batch_size
+                ]
+            )
+            if not ids:
+                return total
+            total += delete(queryset.model.objects.filter(pk__in=ids))
+            self.stdout.write('  {}: {} deleted'.format(label, total))
+            if self.pause:
+                time.sleep(self.pause)
+
+    @staticmethod
+    def delete_reviews(queryset):
+        # Комментарии к этим отзывам к этому моменту уже удалены пачками.
+        reviews, _ = delete_reviews(queryset)
+        return reviews
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.pause = options['pause']
+
+        for title in Title.objects.filter(deleted_at__isnull=False):
+            self.stdout.write('Title {} "{}"'.format(title.pk, title))
+            self.purge('comments', Comment.objects.filter(
+                review__title=title
+            ), delete_comments)
+            self.purge('reviews', title.reviews.all(), self.delete_reviews)
+            title_id = title.pk
+            title.delete()
+            self.stdout.write(
+                self.style.SUCCESS('Title {} purged'.format(title_id))
+            )
+
+        for user in User.objects.filter(deleted_at__isnull=False):
+            self.stdout.write('User {} "{}"'.format(user.pk, user))
+            self.purge('comments', Comment.objects.filter(
+                author=user
+            ), delete_comments)
+            self.purge('comments on reviews', Comment.objects.filter(
+                review__author=user
+            ), delete_comments)
+            self.purge('reviews', Review.objects.filter(
+                author=user
+            ), self.delete_reviews)
+            user_id = user.pk
+            user.delete()
+            self.stdout.write(
+                self.style.SUCCESS('User {} purged'.format(user_id))
+            )
@@ -0,0 +1,158 @@
+import logging
+import os
+import signal
+import sys
+import tracemalloc
+from collections import defaultdict, deque
+from threading import Event, Lock, Thread
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def module_name(filename):
+    """Имя модуля по пути файла: api.serializers, django.db.models.query."""
+    root = max(
+        (path for path in sys.path
+         if path and filename.startswith(path.rstrip(os.sep) + os.sep)),
+        key=len, default=None
+    )
+    if root is None:
+        return filename
+    name = os.path.splitext(
+        filename[len(root):].lstrip(os.sep)
+    )[0].replace(os.sep, '.')
+    suffix = '.__init__'
+    return name[:-len(suffix)] if name.endswith(suffix) else name
+
+
+def take_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(IGNORED_TRACES)
+
+
+def module_stats(new, old, limit):
+    """Изменение памяти между снимками по модулям, где она выделена.
+
+    Возвращает limit модулей с наибольшим ростом в виде словарей с
+    module, size_diff (байты), size и count_diff.
+    """
+    modules = defaultdict(lambda: {'size_diff': 0, 'size': 0,
+                                   'count_diff': 0})
+    for stat in new.compare_to(old, 'filename'):
+        module = modules[module_name(stat.traceback[0].filename)]
+        module['size_diff'] += stat.size_diff
+        module['size'] += stat.size
+        module['count_diff'] += stat.count_diff
+    top = sorted(
+        modules.items(), key=lambda item: item[1]['size_diff'], reverse=True
+    )[:limit]
+    return [dict(stats, module=module) for module, stats in top]
+
+
+def format_stats(stats):
+    return '\n'.join(
+        '{:>+12,} B {:>+8} blocks  {}'.format(
+            item['size_diff'], item['count_diff'], item['module']
+        )
+        for item in stats
+    )
+
+
+class MemoryTracker:
+    """Снимки tracemalloc воркера и отчеты о росте памяти.
+
+    Снимки делаются фоновым потоком раз в MEMORY_SNAPSHOT_INTERVAL секунд,
+    по сигналу SIGUSR2 (kill -USR2 <pid воркера>) и по запросу
+    администратора; последние MEMORY_SNAPSHOTS хранятся в памяти.
+    Снимки по интервалу и сигналу сразу пишутся в лог сравнением с
+    предыдущим.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.snapshots = deque()
+        self.wakeup = Event()
+        self.thread = None
+
+    @property
+    def enabled(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+        self.snapshots = deque(maxlen=settings.MEMORY_SNAPSHOTS)
+        self.take('start')
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        try:
+            signal.signal(signal.SIGUSR2, self.handle_signal)
+        except ValueError:
+            # Обработчик сигнала ставится только из главного потока.
+            logger.warning('SIGUSR2 memory snapshots are not available')
+
+    def handle_signal(self, signum, frame):
+        # Снимок делается в фоновом потоке, а не посреди запроса.
+        self.wakeup.set()
+
+    def run(self):
+        interval = settings.MEMORY_SNAPSHOT_INTERVAL or None
+        while True:
+            self.wakeup.wait(interval)
+            reason = 'signal' if self.wakeup.is_set() else 'interval'
+            self.wakeup.clear()
+            try:
+                self.take(reason)
+                logger.warning(
+                    'Memory snapshot (%s) of worker %s:\n%s', reason,
+                    os.getpid(), format_stats(self.diff(-2))
+                )
+            except Exception:
+                logger.exception('Failed to take memory snapshot')
+
+    def take(self, reason):
+        snapshot = take_snapshot()
+        with self.lock:
+            self.snapshots.append((timezone.now(), reason, snapshot))
+        return snapshot
+
+    def diff(self, index):
+        """Рост памяти от снимка с индексом index до последнего."""
+        with self.lock:
+            snapshots = list(self.snapshots)
+        if len(snapshots) < 2:
+            return []
+        return module_stats(
+            snapshots[-1][2], snapshots[index][2],
+            settings.MEMORY_REPORT_TOP
+        )
+
+    def report(self):
+        current, peak = tracemalloc.get_traced_memory()
+        with self.lock:
+            taken = [
+                {'taken_at': taken_at, 'reason': reason}
+                for taken_at, reason, _ in self.snapshots
+            ]
+        return {
+            'pid': os.getpid(),
+            'traced': current,
+            'peak': peak,
+            'snapshots': taken,
+            'since_previous': self.diff(-2),
+            'since_oldest': self.diff(0),
+        }
+
+
+tracker = MemoryTracker()
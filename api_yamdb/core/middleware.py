@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """Сжимает gzip только JSON-ответы длиннее GZIP_MIN_LENGTH байт.
+
+    Потоковые ответы (server-sent events) не сжимаются, чтобы события
+    не задерживались в буфере компрессора.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming:
+            return response
+        if not response.get('Content-Type', '').startswith(
+            'application/json'
+        ):
+            return response
+        if len(response.content) < settings.GZIP_MIN_LENGTH:
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,52 @@
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """Оценка числа строк выборки по плану запроса PostgreSQL.
+
+    Для других баз и для списков возвращает None.
+    """
+    if not hasattr(queryset, 'query'):
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    # psycopg2 сам разбирает json, но при другом драйвере придет строка.
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, не считающий COUNT(*) на больших выборках.
+
+    Если оценка планировщика больше EXACT_COUNT_THRESHOLD, используется
+    она, а флаг approximate выставляется в True. Ниже порога и для баз без
+    оценок выполняется обычный точный подсчет. Точное значение, известное
+    заранее (например, счетчик у родительского объекта), передается в
+    exact_count.
+    """
+
+    def __init__(self, *args, exact_count=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exact_count = exact_count
+        self.approximate = False
+
+    @cached_property
+    def count(self):
+        if self.exact_count is not None:
+            return self.exact_count
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > settings.EXACT_COUNT_THRESHOLD:
+            self.approximate = True
+            return estimate
+        return super().count
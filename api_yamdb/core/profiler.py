@@ -0,0 +1,131 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import time
+from contextlib import ExitStack
+from uuid import uuid4
+
+from api.permissions import is_admin_request
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+FORMATS = ('text', 'pstats')
+
+
+class QueryTimer:
+    """Обертка execute_wrapper, запоминающая время каждого запроса."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(
+                (sql, (time.perf_counter() - started) * 1000)
+            )
+
+
+class ProfilerMiddleware:
+    """Профилирование отдельного запроса по просьбе администратора.
+
+    Запрос с заголовком X-Profile или параметром ?_profile= выполняется
+    под cProfile, если токен в нем принадлежит администратору. Вместо
+    ответа возвращается отчет: text - топ функций по cumulative и время
+    SQL-запросов, pstats - дамп для pstats, snakeviz или flameprof. При
+    заданном PROFILER_DIR дамп еще и сохраняется туда. Без PROFILER
+    middleware отключается целиком.
+    """
+
+    header = 'HTTP_X_PROFILE'
+    query_param = '_profile'
+
+    def __init__(self, get_response):
+        if not settings.PROFILER:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        output = self.requested_format(request)
+        if output is None or not is_admin_request(request):
+            return self.get_response(request)
+        return self.profile(request, output)
+
+    def requested_format(self, request):
+        value = request.META.get(self.header) or request.GET.get(
+            self.query_param
+        )
+        if not value:
+            return None
+        return value if value in FORMATS else FORMATS[0]
+
+    def profile(self, request, output):
+        timer = QueryTimer()
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            elapsed = (time.perf_counter() - started) * 1000
+        profiler.create_stats()
+        dump = marshal.dumps(profiler.stats)
+        saved = self.save(request, dump)
+
+        if output == 'pstats':
+            report = HttpResponse(
+                dump, content_type='application/octet-stream'
+            )
+            report['Content-Disposition'] = (
+                'attachment; filename="profile.pstats"'
+            )
+        else:
+            report = HttpResponse(
+                self.text_report(request, response, profiler, timer, elapsed),
+                content_type='text/plain; charset=utf-8'
+            )
+        if saved:
+            report['X-Profile-File'] = saved
+        return report
+
+    @staticmethod
+    def save(request, dump):
+        if not settings.PROFILER_DIR:
+            return None
+        os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+        name = '{}-{}-{}-{}.pstats'.format(
+            time.strftime('%Y%m%d-%H%M%S'), request.method,
+            request.path.strip('/').replace('/', '_') or 'root',
+            uuid4().hex[:8]
+        )
+        path = os.path.join(settings.PROFILER_DIR, name)
+        with open(path, 'wb') as file:
+            file.write(dump)
+        return path
+
+    @staticmethod
+    def text_report(request, response, profiler, timer, elapsed):
+        stream = io.StringIO()
+        stream.write('{} {} -> {}, {:.1f} ms\n\n'.format(
+            request.method, request.get_full_path(), response.status_code,
+            elapsed
+        ))
+        stream.write('SQL: {} queries, {:.1f} ms\n'.format(
+            len(timer.queries), sum(ms for _, ms in timer.queries)
+        ))
+        for sql, ms in timer.queries:
+            stream.write('{:>9.2f} ms  {}\n'.format(ms, sql))
+        stream.write('\n')
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(settings.PROFILER_TOP)
+        return stream.getvalue()
@@ -0,0 +1,136 @@
+import logging
+import time
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+STACK_DEPTH = 5
+
+
+class QueryBudgetError(Exception):
+    """Запрос к API выполнил больше SQL-запросов, чем разрешено."""
+
+
+def endpoint_name(view_func, method):
+    """Имя обработчика вида TitleViewSet.list или signup."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', repr(view_func))
+    actions = getattr(view_func, 'actions', None) or {}
+    return '{}.{}'.format(
+        cls.__name__, actions.get(method.lower(), method.lower())
+    )
+
+
+def project_stack():
+    """Последние кадры стека из кода проекта, без библиотек."""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in frame.filename
+        and frame.filename != __file__
+    ]
+    return ''.join(traceback.format_list(frames[-STACK_DEPTH:]))
+
+
+class QueryRecorder:
+    """Обертка execute_wrapper, считающая запросы одного HTTP-запроса.
+
+    Запросы дольше SLOW_QUERY_MS пишутся в лог с планом EXPLAIN и местом
+    вызова в коде проекта.
+    """
+
+    def __init__(self):
+        self.endpoint = None
+        self.count = 0
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        self.count += 1
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            if elapsed >= settings.SLOW_QUERY_MS:
+                self.log_slow(sql, params, many, context, elapsed)
+
+    def explain(self, sql, params, context):
+        connection = context['connection']
+        self.explaining = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    '{} {}'.format(connection.ops.explain_query_prefix(), sql),
+                    params
+                )
+                return '\n'.join(
+                    ' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()
+                )
+        except Exception as error:
+            return 'EXPLAIN failed: {}'.format(error)
+        finally:
+            self.explaining = False
+
+    def log_slow(self, sql, params, many, context, elapsed):
+        plan = ''
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            plan = self.explain(sql, params, context)
+        logger.warning(
+            'Slow query in %s: %.1f ms\n%s\nparams: %r\nplan:\n%s\n'
+            'origin:\n%s',
+            self.endpoint, elapsed, sql, params, plan, project_stack()
+        )
+
+
+class QueryLogMiddleware(MiddlewareMixin):
+    """Журнал медленных запросов и бюджеты числа запросов на обработчик.
+
+    Подключается настройкой QUERY_LOG. Бюджеты задаются в QUERY_BUDGETS
+    как {'TitleViewSet.list': 4}; превышение пишется в лог, а при
+    QUERY_BUDGETS_STRICT поднимается QueryBudgetError, что валит тесты.
+    """
+
+    def __init__(self, get_response=None):
+        if not settings.QUERY_LOG:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        request.query_recorder = QueryRecorder()
+        request.query_wrappers = ExitStack()
+        for connection in connections.all():
+            request.query_wrappers.enter_context(
+                connection.execute_wrapper(request.query_recorder)
+            )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_recorder.endpoint = endpoint_name(
+            view_func, request.method
+        )
+
+    def process_response(self, request, response):
+        request.query_wrappers.close()
+        self.check_budget(request.query_recorder)
+        return response
+
+    @staticmethod
+    def check_budget(recorder):
+        budget = settings.QUERY_BUDGETS.get(recorder.endpoint)
+        if budget is None or recorder.count <= budget:
+            return
+        message = '{} made {} queries, budget is {}'.format(
+            recorder.endpoint, recorder.count, budget
+        )
+        if settings.QUERY_BUDGETS_STRICT:
+            raise QueryBudgetError(message)
+        logger.warning(message)
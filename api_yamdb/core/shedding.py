@@ -0,0 +1,118 @@
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+from api.events import hub
+from api.permissions import is_admin_request
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+OVERLOADED_MESSAGE = 'Сервер перегружен, повторите запрос позже.'
+
+
+def overloaded_response():
+    """Ответ 503 с Retry-After для отказа по перегрузке."""
+    response = JsonResponse(
+        {'detail': OVERLOADED_MESSAGE}, status=503,
+        json_dumps_params={'ensure_ascii': False}
+    )
+    response['Retry-After'] = str(settings.SHED_RETRY_AFTER)
+    return response
+
+
+def parse_request_start(value):
+    """Время из заголовка X-Request-Start в секундах.
+
+    nginx передает t=<секунды.миллисекунды>, другие прокси - целые
+    миллисекунды или микросекунды.
+    """
+    try:
+        stamp = float(value.strip().lstrip('t='))
+    except ValueError:
+        return None
+    if stamp > 1e14:
+        return stamp / 1e6
+    if stamp > 1e11:
+        return stamp / 1e3
+    return stamp
+
+
+class LoadState:
+    """Число запросов в обработке и сглаженная задержка в очереди."""
+
+    alpha = 0.2
+
+    def __init__(self):
+        self.lock = Lock()
+        self.in_flight = 0
+        self.queue_latency = 0.0
+
+    def observe(self, latency):
+        with self.lock:
+            self.queue_latency += self.alpha * (latency - self.queue_latency)
+
+    @contextmanager
+    def track(self):
+        with self.lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class LoadSheddingMiddleware:
+    """Быстрый отказ 503 с Retry-After при перегрузке воркера.
+
+    Перегрузка определяется по числу запросов в обработке и по
+    экспоненциально сглаженному времени ожидания в очереди (от
+    X-Request-Start, который ставит nginx, до начала обработки).
+    Изменяющие запросы отклоняются раньше: им доступно на
+    SHED_RESERVED_IN_FLIGHT мест меньше и у них ниже порог задержки, так
+    что часть мощности всегда остается чтению. Запросы администраторов
+    не отклоняются; их токен проверяется только когда запрос иначе был бы
+    отклонен.
+
+    Число запросов в обработке учитывается только в многопоточном воркере
+    (wsgi.multithread, gunicorn --worker-class gthread): в синхронном
+    воркере в обработке всегда один текущий запрос, и перегрузка видна
+    только по задержке. Порог SHED_MAX_IN_FLIGHT должен быть меньше числа
+    потоков, иначе он недостижим. Потоки SSE держат поток воркера уже
+    после выхода из middleware, поэтому открытые потоки событий
+    прибавляются к числу запросов в обработке.
+    """
+
+    def __init__(self, get_response):
+        if not settings.LOAD_SHEDDING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.state = LoadState()
+
+    def __call__(self, request):
+        self.observe(request)
+        if self.overloaded(request) and not is_admin_request(request):
+            return overloaded_response()
+        with self.state.track():
+            return self.get_response(request)
+
+    def observe(self, request):
+        header = request.META.get('HTTP_X_REQUEST_START')
+        started = parse_request_start(header) if header else None
+        if started is not None:
+            self.state.observe(max(time.time() - started, 0))
+
+    def overloaded(self, request):
+        if request.method in SAFE_METHODS:
+            limit = settings.SHED_MAX_IN_FLIGHT
+            max_latency = settings.SHED_READ_QUEUE_LATENCY
+        else:
+            limit = (settings.SHED_MAX_IN_FLIGHT
+                     - settings.SHED_RESERVED_IN_FLIGHT)
+            max_latency = settings.SHED_WRITE_QUEUE_LATENCY
+        busy = (request.META.get('wsgi.multithread', False)
+                and self.state.in_flight + hub.count >= limit)
+        return busy or self.state.queue_latency > max_latency
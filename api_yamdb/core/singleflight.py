@@ -0,0 +1,112 @@
+import hashlib
+import time
+from threading import Event, Lock
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+LOCK_KEY = 'singleflight:lock:{}'
+RESULT_KEY = 'singleflight:result:{}'
+
+_missing = object()
+
+
+class Call:
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединение одновременных вычислений с одинаковым ключом.
+
+    Первый вызов с ключом выполняет функцию, остальные, пришедшие до его
+    завершения, ждут и получают тот же результат или то же исключение.
+    Если ожидание дольше SINGLE_FLIGHT_TIMEOUT, вызов выполняет функцию
+    сам.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.calls = {}
+
+    def do(self, key, func):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+        if not leader:
+            return self.wait(call, func)
+        try:
+            call.result = func()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+    @staticmethod
+    def wait(call, func):
+        if not call.done.wait(settings.SINGLE_FLIGHT_TIMEOUT):
+            return func()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+def shared_flight(key, func):
+    """Объединение вычислений между воркерами через блокировку в кэше.
+
+    Ведущий воркер кладет в кэш блокировку со случайным токеном и после
+    вычисления публикует результат под этим токеном на
+    SINGLE_FLIGHT_RESULT_TTL секунд. Остальные опрашивают кэш, пока
+    блокировка держится тем же токеном. Исключения не передаются: если
+    результата нет, воркер выполняет функцию сам.
+    """
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    lock_key = LOCK_KEY.format(digest)
+    token = uuid4().hex
+    if cache.add(lock_key, token, settings.SINGLE_FLIGHT_TIMEOUT):
+        try:
+            result = func()
+            cache.set(
+                RESULT_KEY.format(token), result,
+                settings.SINGLE_FLIGHT_RESULT_TTL
+            )
+        finally:
+            cache.delete(lock_key)
+        return result
+
+    owner = cache.get(lock_key)
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_TIMEOUT
+    while owner is not None and time.monotonic() < deadline:
+        time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+        # Ведущий публикует результат раньше, чем снимает блокировку,
+        # поэтому после снятия блокировки результат проверяется еще раз.
+        released = cache.get(lock_key) != owner
+        result = cache.get(RESULT_KEY.format(owner), _missing)
+        if result is not _missing:
+            return result
+        if released:
+            break
+    return func()
+
+
+group = SingleFlight()
+
+
+def single_flight(key, func):
+    """Выполняет func один раз на группу одновременных вызовов с key.
+
+    При SINGLE_FLIGHT_SHARED вычисление дополнительно объединяется между
+    воркерами через общий кэш.
+    """
+    if settings.SINGLE_FLIGHT_SHARED:
+        return group.do(key, lambda: shared_flight(key, func))
+    return group.do(key, func)
@@ -1,16 +1,70 @@
+from core.paginator import EstimatedCountPaginator
 from django.contrib import admin
+from django.db.models.functions import Substr
 
 from .models import Category, Comment, Genre, Review, Title
+from .moderation import delete_comments, delete_reviews
+
+TEXT_PREVIEW_LENGTH = 80
+
+
+class LightChangeListAdmin(admin.ModelAdmin):
+    """Список объектов, который не тянет полные тексты и лишние запросы.
+
+    На странице списка загружаются только поля из list_only, текст
+    обрезается в базе, count берется из оценки планировщика, а
+    стандартное удаление через сборщик заменено set-based действием.
+    """
+
+    list_only = ()
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        url_name = getattr(request.resolver_match, 'url_name', '') or ''
+        if not url_name.endswith('_changelist'):
+            return queryset
+        return queryset.select_related(*self.list_select_related).only(
+            *self.list_only
+        ).annotate(short_text=Substr('text', 1, TEXT_PREVIEW_LENGTH))
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def short_text(self, obj):
+        text = obj.short_text
+        if len(text) < TEXT_PREVIEW_LENGTH:
+            return text
+        return text + '…'
+    short_text.short_description = 'Текст'
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'slug')
+    search_fields = ('name', 'slug')
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ('id', 'review', 'author', 'text')
+class CommentAdmin(LightChangeListAdmin):
+    list_display = ('id', 'review_id', 'author', 'short_text', 'pub_date')
+    list_select_related = ('author', )
+    list_only = ('id', 'review_id', 'pub_date', 'author__id',
+                 'author__username')
+    raw_id_fields = ('review', )
+    autocomplete_fields = ('author', )
+    actions = ('delete_selected_comments', )
+
+    def delete_selected_comments(self, request, queryset):
+        deleted = delete_comments(queryset)
+        self.message_user(request, f'Удалено комментариев: {deleted}.')
+    delete_selected_comments.short_description = (
+        'Удалить выбранные комментарии'
+    )
+    delete_selected_comments.allowed_permissions = ('delete', )
 
 
 @admin.register(Genre)
@@ -19,10 +73,28 @@ class GenreAdmin(admin.ModelAdmin):
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'author', 'text', 'score')
+class ReviewAdmin(LightChangeListAdmin):
+    list_display = ('id', 'title', 'author', 'short_text', 'score',
+                    'comment_count')
+    list_select_related = ('title', 'author')
+    list_only = ('id', 'score', 'comment_count', 'title__id', 'title__name',
+                 'author__id', 'author__username')
+    autocomplete_fields = ('title', 'author')
+    actions = ('delete_selected_reviews', )
+
+    def delete_selected_reviews(self, request, queryset):
+        reviews, comments = delete_reviews(queryset)
+        self.message_user(
+            request,
+            f'Удалено отзывов: {reviews}, комментариев: {comments}.'
+        )
+    delete_selected_reviews.short_description = 'Удалить выбранные отзывы'
+    delete_selected_reviews.allowed_permissions = ('delete', )
 
 
 @admin.register(Title)
 class TitleAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'year', 'description', 'category')
+    list_select_related = ('category', )
+    search_fields = ('name', )
+    autocomplete_fields = ('category', )
@@ -0,0 +1,46 @@
+from django.db import connections, transaction
+
+from .models import Comment, Review, Title
+from .moderation import refresh_counters
+
+
+def insert(model, objs):
+    """Вставляет объекты пачкой и возвращает их с заполненными pk.
+
+    Без поддержки RETURNING (SQLite при разработке) pk после bulk_create
+    неизвестны, поэтому строки вставляются по одной; сигналы post_save в
+    этом случае срабатывают, но счетчики все равно пересчитываются ниже.
+    """
+    connection = connections[model.objects.db]
+    if connection.features.can_return_ids_from_bulk_insert:
+        return model.objects.bulk_create(objs)
+    for obj in objs:
+        obj.save(force_insert=True)
+    return objs
+
+
+@transaction.atomic
+def create_titles(titles, genres):
+    """Создает произведения; genres - списки жанров в том же порядке."""
+    titles = insert(Title, titles)
+    through = Title.genre.through
+    through.objects.bulk_create([
+        through(title_id=title.pk, genre_id=genre.pk)
+        for title, title_genres in zip(titles, genres)
+        for genre in title_genres
+    ])
+    return titles
+
+
+@transaction.atomic
+def create_reviews(reviews):
+    reviews = insert(Review, reviews)
+    refresh_counters(title_ids={review.title_id for review in reviews})
+    return reviews
+
+
+@transaction.atomic
+def create_comments(comments):
+    comments = insert(Comment, comments)
+    refresh_counters(review_ids={comment.review_id for comment in comments})
+    return comments
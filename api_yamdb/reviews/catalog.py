@@ -0,0 +1,106 @@
+import time
+from threading import Lock
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import CatalogVersion, Category, Genre
+
+_lock = Lock()
+_snapshot = None
+_checked_at = float('-inf')
+
+
+class Section:
+    """Неизменяемая копия одного справочника.
+
+    Хранит кортежи значений полей в порядке Meta.ordering и индекс по
+    slug, а экземпляры модели собирает заново при каждом обращении, чтобы
+    запросы не делили между собой изменяемые объекты.
+    """
+
+    def __init__(self, model):
+        names = [field.attname for field in model._meta.concrete_fields]
+        self.model = model
+        self.rows = tuple(model.objects.values_list(*names))
+        slug_index = names.index('slug')
+        self.by_slug = MappingProxyType(
+            {row[slug_index]: row for row in self.rows}
+        )
+
+    def instance(self, row):
+        return self.model.from_db('default', None, row)
+
+    def all(self):
+        return [self.instance(row) for row in self.rows]
+
+    def get(self, slug):
+        row = self.by_slug.get(slug)
+        return None if row is None else self.instance(row)
+
+    def ids_containing(self, value):
+        """id записей, slug которых содержит value без учета регистра."""
+        value = value.lower()
+        return [
+            row[0] for slug, row in self.by_slug.items()
+            if value in slug.lower()
+        ]
+
+
+class Snapshot:
+    def __init__(self, version):
+        self.version = version
+        self.categories = Section(Category)
+        self.genres = Section(Genre)
+
+    def section(self, model):
+        return {Category: self.categories, Genre: self.genres}[model]
+
+
+def current_version():
+    return CatalogVersion.objects.filter(pk=1).values_list(
+        'version', flat=True
+    ).first() or 0
+
+
+def get_snapshot():
+    """Снимок категорий и жанров, актуальный для этого воркера.
+
+    Версия в базе сверяется не чаще раза в CATALOG_CHECK_INTERVAL секунд,
+    поэтому изменения из других воркеров становятся видны с этой
+    задержкой. Версия читается раньше самих справочников: если между
+    чтениями что-то изменилось, снимок получит старую версию и будет
+    перечитан при следующей сверке.
+    """
+    now = time.monotonic()
+    if (_snapshot is None
+            or now - _checked_at >= settings.CATALOG_CHECK_INTERVAL):
+        refresh(now)
+    return _snapshot
+
+
+def refresh(now):
+    global _snapshot, _checked_at
+    with _lock:
+        version = current_version()
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = Snapshot(version)
+        _checked_at = now
+
+
+def invalidate():
+    """Заставляет сверить версию при следующем обращении к снимку."""
+    global _checked_at
+    _checked_at = float('-inf')
+
+
+def bump_version():
+    """Увеличивает версию справочников после их изменения."""
+    updated = CatalogVersion.objects.filter(pk=1).update(
+        version=F('version') + 1
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    transaction.on_commit(invalidate)
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0006_title_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('review', 'отзыв'), ('comment', 'комментарий')], max_length=10)),
+                ('title_id', models.PositiveIntegerField()),
+                ('review_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('payload', models.TextField()),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Событие',
+                'verbose_name_plural': 'События',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='activityevent',
+            index=models.Index(fields=['title_id', 'id'], name='event_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activityevent',
+            index=models.Index(fields=['review_id', 'id'], name='event_review_id_idx'),
+        ),
+    ]
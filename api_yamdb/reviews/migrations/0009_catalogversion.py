@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    CatalogVersion = apps.get_model('reviews', 'CatalogVersion')
+    CatalogVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0008_similartitle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Версия справочников',
+                'verbose_name_plural': 'Версия справочников',
+            },
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
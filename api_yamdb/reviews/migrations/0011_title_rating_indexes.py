@@ -0,0 +1,68 @@
+from django.db import migrations, models
+from django.db.models import Avg, FloatField, OuterRef, Subquery
+
+
+def fill_rating(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    Review = apps.get_model('reviews', 'Review')
+    ratings = Review.objects.filter(
+        title=OuterRef('pk')
+    ).order_by().values('title').annotate(value=Avg('score')).values('value')
+    Title.objects.update(
+        rating=Subquery(ratings, output_field=FloatField())
+    )
+
+
+# Сортировка ?ordering=-rating идет с NULLS LAST, чтобы произведения без
+# отзывов были в конце. Обычный индекс PostgreSQL при обратном проходе
+# дает NULLS FIRST, поэтому для нее нужен отдельный индекс, который
+# Index в Django 2.2 описать не умеет.
+RATING_DESC_INDEX = 'title_rating_desc_idx'
+
+
+def create_rating_desc_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX {} ON reviews_title (rating DESC NULLS LAST, id DESC)'
+        .format(RATING_DESC_INDEX)
+    )
+
+
+def drop_rating_desc_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS {}'.format(RATING_DESC_INDEX))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0010_title_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='rating',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='Рейтинг'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['rating', 'id'], name='title_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['year', 'id'], name='title_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['name', 'id'], name='title_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='title',
+            index=models.Index(fields=['review_count', 'id'], name='title_review_count_idx'),
+        ),
+        migrations.RunPython(fill_rating, migrations.RunPython.noop),
+        migrations.RunPython(create_rating_desc_index, drop_rating_desc_index),
+    ]
@@ -0,0 +1,38 @@
+import json
+
+from django.db import migrations, models
+
+
+def fill_object_id(apps, schema_editor):
+    ActivityEvent = apps.get_model('reviews', 'ActivityEvent')
+    events = ActivityEvent.objects.filter(object_id__isnull=True).only(
+        'id', 'payload'
+    )
+    batch = []
+    for event in events.iterator(chunk_size=1000):
+        event.object_id = json.loads(event.payload).get('id')
+        batch.append(event)
+        if len(batch) == 1000:
+            ActivityEvent.objects.bulk_update(batch, ['object_id'])
+            batch = []
+    ActivityEvent.objects.bulk_update(batch, ['object_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0011_title_rating_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activityevent',
+            name='object_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_object_id, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='activityevent',
+            index=models.Index(fields=['kind', 'object_id'], name='event_object_idx'),
+        ),
+    ]
@@ -3,10 +3,34 @@ import datetime as dt
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 User = get_user_model()
 
 
+class ServiceFieldsMixin:
+    """Обычный save() существующей записи не пишет поля service_fields.
+
+    Счетчики, рейтинг и служебные отметки меняются только целевыми
+    UPDATE (reviews.signals, reviews.moderation, команды). Экземпляр,
+    загруженный в начале запроса, хранит их старые значения, и полный
+    save() вернул бы их, затерев параллельные изменения.
+    """
+
+    service_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not args
+                and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.service_fields
+            ]
+        super().save(*args, **kwargs)
+
+
 class Category(models.Model):
     name = models.CharField(
         max_length=256
@@ -43,7 +67,22 @@ class Genre(models.Model):
         return self.name
 
 
-class Title(models.Model):
+class CatalogVersion(models.Model):
+    """Счетчик изменений категорий и жанров.
+
+    Единственная строка, версия увеличивается при каждом сохранении и
+    удалении категории или жанра; по ней воркеры обновляют свой снимок
+    справочников (reviews.catalog).
+    """
+
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Версия справочников'
+        verbose_name_plural = 'Версия справочников'
+
+
+class Title(ServiceFieldsMixin, models.Model):
     name = models.CharField(max_length=256)
     year = models.PositiveIntegerField(
         'Год издания',
@@ -66,8 +105,58 @@ class Title(models.Model):
         blank=True,
         null=True
     )
+    review_count = models.PositiveIntegerField(
+        'Количество отзывов',
+        default=0,
+        editable=False
+    )
+    rating = models.FloatField(
+        'Рейтинг',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    deleted_at = models.DateTimeField(
+        'Дата удаления',
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False
+    )
+    changed_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    reviews_changed_at = models.DateTimeField(
+        'Дата изменения отзывов',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    similar_computed_at = models.DateTimeField(
+        'Дата расчета похожих произведений',
+        blank=True,
+        null=True,
+        editable=False
+    )
+
+    service_fields = (
+        'review_count', 'rating', 'deleted_at', 'reviews_changed_at',
+        'similar_computed_at'
+    )
 
     class Meta:
+        # Составные индексы обслуживают сортировку списка: поле плюс id
+        # для устойчивого порядка страниц (api.filters.IndexedOrderingFilter).
+        indexes = [
+            models.Index(fields=['rating', 'id'], name='title_rating_idx'),
+            models.Index(fields=['year', 'id'], name='title_year_idx'),
+            models.Index(fields=['name', 'id'], name='title_name_idx'),
+            models.Index(
+                fields=['review_count', 'id'],
+                name='title_review_count_idx'
+            ),
+        ]
         ordering = ['id']
         verbose_name = 'Произведение'
         verbose_name_plural = 'Произведения'
@@ -75,8 +164,13 @@ class Title(models.Model):
     def __str__(self):
         return self.name
 
+    def soft_delete(self):
+        """Скрывает произведение, отзывы удаляет команда purge_deleted."""
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
 
-class Review(models.Model):
+
+class Review(ServiceFieldsMixin, models.Model):
     title = models.ForeignKey(
         Title,
         on_delete=models.CASCADE,
@@ -96,6 +190,13 @@ class Review(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+
+    service_fields = ('comment_count', )
 
     class Meta:
         constraints = [
@@ -104,6 +205,12 @@ class Review(models.Model):
                 name='unique_review'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='review_author_pub_date_idx'
+            )
+        ]
         ordering = ['pub_date']
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
@@ -131,9 +238,88 @@ class Comment(models.Model):
     )
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='comment_author_pub_date_idx'
+            )
+        ]
         ordering = ['pub_date']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
     def __str__(self):
         return self.text
+
+
+class SimilarTitle(models.Model):
+    """Заранее рассчитанный сосед произведения по оценкам пользователей."""
+
+    title = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='similar_titles'
+    )
+    similar = models.ForeignKey(
+        Title,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['title', 'similar'],
+                name='unique_similar_title'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['title', '-score'],
+                name='similar_title_score_idx'
+            )
+        ]
+        ordering = ['title', '-score']
+        verbose_name = 'Похожее произведение'
+        verbose_name_plural = 'Похожие произведения'
+
+
+class ActivityEvent(models.Model):
+    """Журнал созданных отзывов и комментариев для потоковой раздачи."""
+
+    REVIEW = 'review'
+    COMMENT = 'comment'
+
+    KINDS = [
+        (REVIEW, 'отзыв'),
+        (COMMENT, 'комментарий'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    title_id = models.PositiveIntegerField()
+    review_id = models.PositiveIntegerField(blank=True, null=True)
+    # Id самого отзыва или комментария, чтобы удалять события вместе с ним.
+    object_id = models.PositiveIntegerField(blank=True, null=True)
+    payload = models.TextField()
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['title_id', 'id'],
+                name='event_title_id_idx'
+            ),
+            models.Index(
+                fields=['review_id', 'id'],
+                name='event_review_id_idx'
+            ),
+            models.Index(
+                fields=['kind', 'object_id'],
+                name='event_object_idx'
+            ),
+        ]
+        ordering = ['id']
+        verbose_name = 'Событие'
+        verbose_name_plural = 'События'
@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.db.models import (Avg, Count, FloatField, IntegerField, OuterRef,
+                              Q, Subquery)
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import ActivityEvent, Comment, Review, Title
+
+# Отправляется после set-based удаления вместо post_delete. rows - кортежи
+# (title_id, review_id) удаленных отзывов или (title_id, review_id,
+# comment_id) удаленных комментариев, sender - Review или Comment.
+rows_deleted = Signal()
+
+
+def count_subquery(model, fk_name):
+    """Подзапрос с числом строк model, ссылающихся на внешний объект."""
+    counts = model.objects.filter(
+        **{fk_name: OuterRef('pk')}
+    ).order_by().values(fk_name).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def rating_subquery():
+    """Подзапрос со средней оценкой отзывов произведения."""
+    ratings = Review.objects.filter(
+        title=OuterRef('pk')
+    ).order_by().values('title').annotate(value=Avg('score')).values('value')
+    return Subquery(ratings, output_field=FloatField())
+
+
+def refresh_counters(title_ids=(), review_ids=()):
+    """Пересчитывает счетчики отзывов и комментариев одним UPDATE на модель."""
+    if title_ids:
+        Title.objects.filter(pk__in=title_ids).update(
+            review_count=count_subquery(Review, 'title'),
+            rating=rating_subquery(),
+            reviews_changed_at=timezone.now()
+        )
+    if review_ids:
+        Review.objects.filter(pk__in=review_ids).update(
+            comment_count=count_subquery(Comment, 'review')
+        )
+
+
+def raw_delete(queryset):
+    return queryset._raw_delete(queryset.db)
+
+
+@transaction.atomic
+def delete_comments(queryset):
+    """Удаляет комментарии одним DELETE, без загрузки строк в память.
+
+    События журнала об удаленных комментариях удаляются в той же
+    транзакции. Возвращает число удаленных комментариев.
+    """
+    rows = list(queryset.values_list('review__title_id', 'review_id', 'pk'))
+    raw_delete(ActivityEvent.objects.filter(
+        kind=ActivityEvent.COMMENT, object_id__in=queryset.values('pk')
+    ))
+    # Счетчики пересчитываются ниже, поэтому сигналы post_delete
+    # намеренно не отправляются.
+    deleted = raw_delete(queryset)
+    if deleted:
+        refresh_counters(review_ids={review_id for _, review_id, _ in rows})
+        rows_deleted.send(sender=Comment, rows=rows)
+    return deleted
+
+
+@transaction.atomic
+def delete_reviews(queryset):
+    """Удаляет отзывы вместе с комментариями к ним set-based запросами.
+
+    События журнала об отзывах и комментариях к ним удаляются в той же
+    транзакции. Возвращает пару (число отзывов, число комментариев).
+    """
+    rows = list(queryset.values_list('title_id', 'pk'))
+    review_ids = queryset.values('pk')
+    raw_delete(ActivityEvent.objects.filter(
+        Q(kind=ActivityEvent.REVIEW, object_id__in=review_ids)
+        | Q(kind=ActivityEvent.COMMENT, review_id__in=review_ids)
+    ))
+    comments = Comment.objects.filter(review__in=queryset.values('pk'))
+    deleted_comments = raw_delete(comments)
+    deleted_reviews = raw_delete(queryset)
+    if deleted_reviews:
+        refresh_counters(title_ids={title_id for title_id, _ in rows})
+        rows_deleted.send(sender=Review, rows=rows)
+    return deleted_reviews, deleted_comments
@@ -0,0 +1,66 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .catalog import bump_version
+from .models import Category, Comment, Genre, Review, Title
+from .moderation import rating_subquery
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    # Средняя оценка пересчитывается по отзывам одного произведения в том
+    # же UPDATE: при правке отзыва прежняя оценка неизвестна.
+    changes = {
+        'reviews_changed_at': timezone.now(),
+        'rating': rating_subquery(),
+    }
+    if created:
+        changes['review_count'] = F('review_count') + 1
+    Title.objects.filter(pk=instance.title_id).update(**changes)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    Title.objects.filter(pk=instance.title_id).update(
+        review_count=F('review_count') - 1,
+        rating=rating_subquery(),
+        reviews_changed_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        Review.objects.filter(pk=instance.review_id).update(
+            comment_count=F('comment_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Review.objects.filter(pk=instance.review_id).update(
+        comment_count=F('comment_count') - 1
+    )
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Genre)
+def catalog_changed(sender, **kwargs):
+    bump_version()
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def title_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # clear() выполняется в транзакции вместе с сигналами, а список
+    # затронутых произведений со стороны жанра известен только до очистки.
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        titles = Title.objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        titles = instance.titles.all()
+    else:
+        titles = Title.objects.filter(pk__in=pk_set)
+    titles.update(changed_at=timezone.now())
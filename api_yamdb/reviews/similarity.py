@@ -0,0 +1,139 @@
+"""Похожие произведения по оценкам пользователей.
+
+Сходство считается как adjusted cosine: из каждой оценки вычитается
+средняя оценка ее автора, после чего для пары произведений берется
+косинус векторов по общим авторам. Вся матрица произведение x
+пользователь в память не загружается: постоянно в памяти только средние
+оценки авторов и нормы векторов произведений (по числу авторов и
+произведений), а оценки читаются потоком для каждой пачки произведений -
+только оценки авторов, оценивших произведения пачки. Скалярные
+произведения накапливаются обходом оценок этих авторов, поэтому работа
+пропорциональна числу пар оценок с общими авторами, а не квадрату числа
+произведений. Объем пачки в памяти ограничен числом оценок ее авторов:
+пачку с самыми активными авторами стоит уменьшать через chunk_size.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Avg
+from django.utils import timezone
+
+from .models import Review, SimilarTitle, Title
+
+# Размер пачки строк, которые курсор базы отдает за раз.
+ITERATOR_CHUNK_SIZE = 10000
+
+
+def score_rows(queryset):
+    return queryset.order_by().values_list(
+        'title_id', 'author_id', 'score'
+    ).iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+
+class ScoreMatrix:
+    """Разреженная матрица центрированных оценок, читаемая по частям.
+
+    from_db считает средние оценки авторов и нормы произведений за один
+    проход по оценкам, load загружает строки матрицы для пачки
+    произведений.
+    """
+
+    def __init__(self, means, norms):
+        self.means = means
+        self.norms = norms
+        self.by_user = {}
+        self.by_title = {}
+
+    @classmethod
+    def from_db(cls):
+        means = dict(
+            Review.objects.order_by().values_list('author_id').annotate(
+                mean=Avg('score')
+            )
+        )
+        squares = defaultdict(float)
+        for title_id, author_id, score in score_rows(Review.objects.all()):
+            if author_id in means:
+                squares[title_id] += (score - means[author_id]) ** 2
+        return cls(means, {
+            title_id: math.sqrt(total) for title_id, total in squares.items()
+        })
+
+    def load(self, title_ids):
+        """Загружает оценки всех авторов, оценивших title_ids."""
+        title_ids = set(title_ids)
+        authors = Review.objects.filter(
+            title_id__in=title_ids
+        ).values('author_id')
+        self.by_user = defaultdict(list)
+        self.by_title = defaultdict(dict)
+        for title_id, author_id, score in score_rows(
+            Review.objects.filter(author_id__in=authors)
+        ):
+            # Автор, появившийся после подсчета средних, пропускается.
+            if author_id not in self.means:
+                continue
+            value = score - self.means[author_id]
+            self.by_user[author_id].append((title_id, value))
+            if title_id in title_ids:
+                self.by_title[title_id][author_id] = value
+
+    def neighbours(self, title_id, top_k, min_common):
+        """Возвращает top_k пар (сходство, id) для загруженного title_id."""
+        norm = self.norms.get(title_id)
+        if not norm:
+            return []
+        dots = defaultdict(float)
+        common = defaultdict(int)
+        for author_id, value in self.by_title[title_id].items():
+            for other_id, other_value in self.by_user[author_id]:
+                if other_id != title_id:
+                    dots[other_id] += value * other_value
+                    common[other_id] += 1
+        candidates = (
+            (dot / (norm * self.norms[other_id]), other_id)
+            for other_id, dot in dots.items()
+            if common[other_id] >= min_common and self.norms.get(other_id)
+        )
+        return [
+            (score, other_id)
+            for score, other_id in heapq.nlargest(top_k, candidates)
+            if score > 0
+        ]
+
+
+@transaction.atomic
+def store_neighbours(title_ids, neighbours, computed_at):
+    SimilarTitle.objects.filter(title_id__in=title_ids).delete()
+    SimilarTitle.objects.bulk_create([
+        SimilarTitle(title_id=title_id, similar_id=other_id, score=score)
+        for title_id in title_ids
+        for score, other_id in neighbours.get(title_id, ())
+    ])
+    Title.objects.filter(pk__in=title_ids).update(
+        similar_computed_at=computed_at
+    )
+
+
+def build_similar_titles(title_ids, top_k=10, min_common=2, chunk_size=500,
+                         progress=None):
+    """Пересчитывает соседей для title_ids пачками по chunk_size.
+
+    Для каждой пачки в память читаются только оценки ее авторов.
+    Возвращает число обработанных произведений.
+    """
+    computed_at = timezone.now()
+    matrix = ScoreMatrix.from_db()
+    title_ids = list(title_ids)
+    for start in range(0, len(title_ids), chunk_size):
+        chunk = title_ids[start:start + chunk_size]
+        matrix.load(chunk)
+        store_neighbours(chunk, {
+            title_id: matrix.neighbours(title_id, top_k, min_common)
+            for title_id in chunk
+        }, computed_at)
+        if progress:
+            progress(start + len(chunk), len(title_ids))
+    return len(title_ids)
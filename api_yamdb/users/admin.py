@@ -7,3 +7,4 @@ User = get_user_model()
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ('id', 'username', 'email', 'role')
+    search_fields = ('username', 'email')
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -23,8 +24,24 @@ class User(AbstractUser):
     )
     role = models.CharField('роль', choices=ROLES, default='user',
                             max_length=10)
+    deleted_at = models.DateTimeField(
+        'дата удаления',
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False
+    )
 
     REQUIRED_FIELDS = ['email']
 
     class Meta:
         ordering = ['id']
+
+    def soft_delete(self):
+        """Блокирует и скрывает пользователя.
+
+        Отзывы и комментарии пользователя удаляет команда purge_deleted.
+        """
+        self.deleted_at = timezone.now()
+        self.is_active = False
+        self.save(update_fields=['deleted_at', 'is_active'])
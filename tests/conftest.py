@@ -1,9 +1,21 @@
 import sys
 from os.path import abspath, dirname, join
 
+import pytest
+
 root_dir = dirname(dirname(abspath(__file__)))
 sys.path.append(root_dir)
 infra_dir_path = join(root_dir, 'infra')
 
 pytest_plugins = [
 ]
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    """Кэш и снимок справочников не переживают откат базы между тестами."""
+    from django.core.cache import cache
+    from reviews import catalog
+
+    cache.clear()
+    monkeypatch.setattr(catalog, '_snapshot', None)
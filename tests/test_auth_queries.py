@@ -0,0 +1,80 @@
+import pytest
+from django.contrib.auth.tokens import default_token_generator
+from users.models import User
+
+
+@pytest.mark.django_db
+class TestAuthQueries:
+    signup_url = '/api/v1/auth/signup/'
+    token_url = '/api/v1/auth/token/'
+
+    def test_signup_new_user(self, client, django_assert_num_queries):
+        data = {'username': 'reader', 'email': 'reader@example.com'}
+        with django_assert_num_queries(2):
+            response = client.post(self.signup_url, data)
+
+        assert response.status_code == 200, (
+            'Проверьте, что регистрация нового пользователя возвращает 200'
+        )
+        assert User.objects.filter(username='reader').exists()
+
+    def test_signup_existing_user(self, client, django_assert_num_queries):
+        User.objects.create(username='reader', email='reader@example.com')
+        data = {'username': 'reader', 'email': 'reader@example.com'}
+        with django_assert_num_queries(1):
+            response = client.post(self.signup_url, data)
+
+        assert response.status_code == 200, (
+            'Проверьте, что повторная регистрация возвращает 200'
+        )
+
+    def test_signup_conflict(self, client, django_assert_num_queries):
+        User.objects.create(username='reader', email='reader@example.com')
+        data = {'username': 'reader', 'email': 'other@example.com'}
+        with django_assert_num_queries(1):
+            response = client.post(self.signup_url, data)
+
+        assert response.status_code == 400, (
+            'Проверьте, что занятый username возвращает 400'
+        )
+        assert 'username' in response.json()
+
+    def test_token(self, client, django_assert_num_queries):
+        user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        data = {
+            'username': 'reader',
+            'confirmation_code': default_token_generator.make_token(user),
+        }
+        with django_assert_num_queries(1):
+            response = client.post(self.token_url, data)
+
+        assert response.status_code == 200, (
+            'Проверьте, что верный код подтверждения возвращает токен'
+        )
+        assert 'token' in response.json()
+
+    def test_deleted_user_gets_no_code(self, client, mailoutbox):
+        user = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        code = default_token_generator.make_token(user)
+        user.soft_delete()
+
+        response = client.post(
+            self.signup_url,
+            {'username': 'reader', 'email': 'reader@example.com'}
+        )
+
+        assert response.status_code == 400, (
+            'Проверьте, что удаленный пользователь не может '
+            'зарегистрироваться заново'
+        )
+        assert not mailoutbox
+        response = client.post(
+            self.token_url, {'username': 'reader', 'confirmation_code': code}
+        )
+        assert response.status_code == 404, (
+            'Проверьте, что удаленный пользователь не получает токен'
+        )
@@ -0,0 +1,53 @@
+import pytest
+from api.serializers import ReviewSerializer, TitlePostSerializer
+from reviews.models import Comment, Review, Title
+from users.models import User
+
+
+@pytest.fixture
+def author():
+    return User.objects.create(username='reader', email='reader@example.com')
+
+
+@pytest.mark.django_db
+class TestCounters:
+
+    def test_title_update_keeps_review_counters(self, author):
+        title = Title.objects.create(name='Фильм', year=2000)
+        stale = Title.objects.get(pk=title.pk)
+        Review.objects.create(title=title, author=author, text='Да', score=8)
+
+        serializer = TitlePostSerializer(
+            stale, data={'name': 'Другой фильм'}, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        title.refresh_from_db()
+        assert title.name == 'Другой фильм'
+        assert title.review_count == 1, (
+            'Проверьте, что правка произведения не перезаписывает '
+            'review_count, посчитанный параллельно'
+        )
+        assert title.rating == 8
+        assert title.reviews_changed_at is not None
+
+    def test_review_update_keeps_comment_count(self, author):
+        title = Title.objects.create(name='Фильм', year=2000)
+        review = Review.objects.create(
+            title=title, author=author, text='Да', score=8
+        )
+        stale = Review.objects.get(pk=review.pk)
+        Comment.objects.create(review=review, author=author, text='Нет')
+
+        serializer = ReviewSerializer(
+            stale, data={'text': 'Нет, да'}, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        review.refresh_from_db()
+        assert review.text == 'Нет, да'
+        assert review.comment_count == 1, (
+            'Проверьте, что правка отзыва не перезаписывает comment_count'
+        )
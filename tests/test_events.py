@@ -0,0 +1,112 @@
+import pytest
+from api.events import EventHub, SubscribersLimitError, hub, make_event
+from core.shedding import LoadSheddingMiddleware
+from django.http import HttpResponse
+from reviews.models import ActivityEvent, Title
+
+
+def log(event_id, title_id=1):
+    event = make_event(ActivityEvent.REVIEW, {'id': event_id}, title_id)
+    event.id = event_id
+    event.save(force_insert=True)
+
+
+def received(queue):
+    ids = []
+    while not queue.empty():
+        ids.append(queue.get_nowait().id)
+    return ids
+
+
+@pytest.fixture(name='hub')
+def local_hub():
+    hub = EventHub()
+    # Опрос в тестах вызывается вручную, без фонового потока.
+    hub.thread = object()
+    return hub
+
+
+@pytest.mark.django_db
+class TestEventHub:
+
+    def test_waits_for_gap(self, hub):
+        queue, position = hub.subscribe(('title', 1))
+        assert position == 0
+        log(1)
+        log(3)
+
+        hub.poll()
+        assert received(queue) == [1], (
+            'Проверьте, что хаб не раздает события за пропуском в id'
+        )
+
+        # Транзакция события 2 зафиксирована позже события 3.
+        log(2)
+        hub.poll()
+        assert received(queue) == [2, 3]
+        assert hub.last_id == 3
+
+    def test_skips_gap_after_timeout(self, hub, settings):
+        settings.EVENTS_GAP_TIMEOUT = 0
+        queue, _ = hub.subscribe(('title', 1))
+        log(1)
+        log(3)
+
+        hub.poll()
+        assert received(queue) == [1, 3], (
+            'Проверьте, что пропуск считается пустым после '
+            'EVENTS_GAP_TIMEOUT'
+        )
+
+    def test_position_covers_dispatched_events(self, hub):
+        hub.subscribe(('title', 1))
+        log(1, title_id=2)
+        hub.poll()
+
+        _, position = hub.subscribe(('title', 2))
+        assert position == 1, (
+            'Проверьте, что новый подписчик читает из журнала уже '
+            'разданные события'
+        )
+
+    def test_subscribers_limit(self, hub, settings):
+        settings.EVENTS_MAX_SUBSCRIBERS = 2
+        first, _ = hub.subscribe(('title', 1))
+        hub.subscribe(('title', 2))
+
+        with pytest.raises(SubscribersLimitError):
+            hub.subscribe(('title', 1))
+
+        hub.unsubscribe(('title', 1), first)
+        hub.unsubscribe(('title', 1), first)
+        assert hub.count == 1
+        hub.subscribe(('title', 1))
+
+
+@pytest.mark.django_db
+class TestEventStreamLimit:
+
+    def test_stream_over_limit(self, client, settings):
+        settings.EVENTS_MAX_SUBSCRIBERS = 0
+        title = Title.objects.create(name='Фильм', year=2000)
+
+        response = client.get('/api/v1/titles/{}/events/'.format(title.pk))
+
+        assert response.status_code == 503, (
+            'Проверьте, что сверх EVENTS_MAX_SUBSCRIBERS поток событий '
+            'получает 503'
+        )
+        assert response['Retry-After'] == str(settings.SHED_RETRY_AFTER)
+
+    def test_streams_count_for_shedding(self, rf, monkeypatch, settings):
+        monkeypatch.setattr(hub, 'count', settings.SHED_MAX_IN_FLIGHT)
+        middleware = LoadSheddingMiddleware(lambda request: HttpResponse())
+
+        response = middleware(
+            rf.get('/api/v1/titles/', **{'wsgi.multithread': True})
+        )
+
+        assert response.status_code == 503, (
+            'Проверьте, что открытые потоки событий учитываются в '
+            'SHED_MAX_IN_FLIGHT'
+        )
@@ -0,0 +1,106 @@
+import pytest
+from core.cache_purge import get_purger
+from django.contrib.admin.sites import site
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from reviews.models import Comment, Review, Title
+from users.models import User
+
+
+@pytest.fixture
+def purged():
+    purger = get_purger()
+    purger.purged.clear()
+    yield purger.purged
+    purger.purged.clear()
+
+
+@pytest.fixture
+def content():
+    author = User.objects.create(username='spam', email='spam@example.com')
+    reader = User.objects.create(username='reader', email='r@example.com')
+    title = Title.objects.create(name='Фильм', year=2000)
+    spam = Review.objects.create(title=title, author=author, text='С', score=1)
+    kept = Review.objects.create(title=title, author=reader, text='Х', score=9)
+    Comment.objects.create(review=spam, author=reader, text='Ответ')
+    comment = Comment.objects.create(review=kept, author=author, text='С')
+    Comment.objects.create(review=kept, author=reader, text='Ответ')
+    return title, spam, kept, comment
+
+
+def paths(title, spam, kept, comment):
+    """Пути, которые устаревают после удаления спама автора."""
+    return {
+        '/api/v1/titles/',
+        '/api/v1/titles/{}/'.format(title.pk),
+        '/api/v1/titles/{}/reviews/'.format(title.pk),
+        '/api/v1/titles/{}/reviews/{}/'.format(title.pk, spam.pk),
+        '/api/v1/titles/{}/reviews/{}/comments/'.format(title.pk, spam.pk),
+        '/api/v1/titles/{}/reviews/{}/comments/'.format(title.pk, kept.pk),
+        '/api/v1/titles/{}/reviews/{}/comments/{}/'.format(
+            title.pk, kept.pk, comment.pk
+        ),
+    }
+
+
+# Сброс кэша прокси выполняется в on_commit, поэтому нужны настоящие
+# транзакции.
+@pytest.mark.django_db(transaction=True)
+class TestModerationDelete:
+
+    def check_deleted(self, title, spam, kept):
+        assert not Review.objects.filter(pk=spam.pk).exists()
+        assert not Comment.objects.filter(author__username='spam').exists()
+        assert Comment.objects.count() == 1
+        title.refresh_from_db()
+        kept.refresh_from_db()
+        assert (title.review_count, title.rating) == (1, 9), (
+            'Проверьте, что счетчик и рейтинг произведения пересчитаны'
+        )
+        assert kept.comment_count == 1, (
+            'Проверьте, что счетчик комментариев отзыва пересчитан'
+        )
+
+    def test_endpoint(self, content, purged):
+        moderator = User.objects.create(
+            username='moderator', email='m@example.com', role='moderator'
+        )
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Bearer {}'.format(
+            AccessToken.for_user(moderator)
+        ))
+
+        response = client.post(
+            '/api/v1/moderation/delete/', {'author': 'spam'}, format='json'
+        )
+
+        assert response.json() == {'reviews': 1, 'comments': 2}
+        self.check_deleted(*content[:3])
+        assert set(purged) == paths(*content), (
+            'Проверьте, что после удаления обновляются пути произведения, '
+            'отзывов и комментариев затронутых отзывов'
+        )
+
+    def test_admin_actions(self, content, purged, rf, monkeypatch):
+        title, spam, kept, comment = content
+        request = rf.post('/admin/')
+        request.user = User.objects.create(
+            username='root', email='root@example.com', is_superuser=True
+        )
+        admins = site._registry
+        for model in (Comment, Review):
+            monkeypatch.setattr(
+                admins[model], 'message_user', lambda *args: None
+            )
+
+        admins[Comment].delete_selected_comments(
+            request, Comment.objects.filter(pk=comment.pk)
+        )
+        admins[Review].delete_selected_reviews(
+            request, Review.objects.filter(pk=spam.pk)
+        )
+
+        self.check_deleted(title, spam, kept)
+        assert set(purged) == paths(*content), (
+            'Проверьте, что действия удаления в админке обновляют кэш прокси'
+        )
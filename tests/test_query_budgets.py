@@ -0,0 +1,198 @@
+from itertools import count
+
+import pytest
+from core.querylog import QueryBudgetError
+from django.conf import settings as django_settings
+from django.contrib.auth.tokens import default_token_generator
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from reviews.models import Category, Comment, Genre, Review, Title
+from users.models import User
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION='Bearer {}'.format(AccessToken.for_user(user))
+    )
+    client.user = user
+    return client
+
+
+class World:
+    """Данные и клиенты для запросов ко всем обработчикам с бюджетом."""
+
+    def __init__(self):
+        admin = User.objects.create(
+            username='admin', email='admin@example.com', role='admin'
+        )
+        reader = User.objects.create(
+            username='reader', email='reader@example.com'
+        )
+        self.writer = User.objects.create(
+            username='writer', email='writer@example.com'
+        )
+        self.admin = client_for(admin)
+        self.user = client_for(reader)
+        self.anon = APIClient()
+        self.numbers = count()
+
+        self.category = Category.objects.create(name='Фильм', slug='film')
+        self.genres = [
+            Genre.objects.create(name='Драма', slug='drama'),
+            Genre.objects.create(name='Комедия', slug='comedy'),
+        ]
+        self.titles = []
+        for number in range(4):
+            title = Title.objects.create(
+                name='Фильм {}'.format(number), year=2000 + number,
+                category=self.category
+            )
+            title.genre.set(self.genres)
+            self.titles.append(title)
+        self.title = self.titles[0]
+        self.review = Review.objects.create(
+            title=self.title, author=reader, text='Отзыв', score=7
+        )
+        self.comment = Comment.objects.create(
+            review=self.review, author=reader, text='Комментарий'
+        )
+
+    def next_title(self):
+        """Произведение без отзыва writer: отзыв на него можно создать."""
+        return self.titles[next(self.numbers) % len(self.titles)]
+
+    def reviews_url(self, title):
+        return '/api/v1/titles/{}/reviews/'.format(title.pk)
+
+    def comments_url(self):
+        return '{}{}/comments/'.format(
+            self.reviews_url(self.title), self.review.pk
+        )
+
+
+def title_data(world):
+    return {
+        'name': 'Новый фильм {}'.format(next(world.numbers)),
+        'year': 2010,
+        'category': 'film',
+        'genre': ['drama'],
+    }
+
+
+# Обработчик: (клиент, метод, адрес, тело запроса).
+CASES = {
+    'TitleViewSet.list': lambda w: (w.user, 'get', '/api/v1/titles/', None),
+    'TitleViewSet.retrieve': lambda w: (
+        w.user, 'get', '/api/v1/titles/{}/'.format(w.title.pk), None
+    ),
+    'TitleViewSet.batch': lambda w: (
+        w.user, 'get', '/api/v1/titles/batch/?ids={}'.format(
+            ','.join(str(title.pk) for title in w.titles)
+        ), None
+    ),
+    'TitleViewSet.similar': lambda w: (
+        w.user, 'get', '/api/v1/titles/{}/similar/'.format(w.title.pk), None
+    ),
+    'TitleViewSet.facets': lambda w: (
+        w.user, 'get', '/api/v1/titles/facets/', None
+    ),
+    'TitleViewSet.create': lambda w: (
+        w.admin, 'post', '/api/v1/titles/', title_data(w)
+    ),
+    'TitleViewSet.partial_update': lambda w: (
+        w.admin, 'patch', '/api/v1/titles/{}/'.format(w.title.pk),
+        {'name': 'Фильм {}'.format(next(w.numbers)), 'genre': ['comedy']}
+    ),
+    'ReviewViewSet.list': lambda w: (
+        w.user, 'get', w.reviews_url(w.title), None
+    ),
+    'ReviewViewSet.retrieve': lambda w: (
+        w.user, 'get', '{}{}/'.format(w.reviews_url(w.title), w.review.pk),
+        None
+    ),
+    'ReviewViewSet.create': lambda w: (
+        client_for(w.writer), 'post', w.reviews_url(w.next_title()),
+        {'text': 'Отзыв', 'score': 5}
+    ),
+    'CommentViewSet.list': lambda w: (w.user, 'get', w.comments_url(), None),
+    'CommentViewSet.retrieve': lambda w: (
+        w.user, 'get', '{}{}/'.format(w.comments_url(), w.comment.pk), None
+    ),
+    'CommentViewSet.create': lambda w: (
+        w.user, 'post', w.comments_url(), {'text': 'Комментарий'}
+    ),
+    'CategoryViewSet.list': lambda w: (
+        w.user, 'get', '/api/v1/categories/', None
+    ),
+    'GenreViewSet.list': lambda w: (w.user, 'get', '/api/v1/genres/', None),
+    'UserMeActivity.get': lambda w: (
+        w.user, 'get', '/api/v1/users/me/activity/', None
+    ),
+    'UserViewSet.activity': lambda w: (
+        w.admin, 'get', '/api/v1/users/reader/activity/', None
+    ),
+    'signup.post': lambda w: (
+        w.anon, 'post', '/api/v1/auth/signup/', {
+            'username': 'new{}'.format(next(w.numbers)),
+            'email': 'new{}@example.com'.format(next(w.numbers)),
+        }
+    ),
+    'get_token.post': lambda w: (
+        w.anon, 'post', '/api/v1/auth/token/', {
+            'username': 'reader',
+            'confirmation_code': default_token_generator.make_token(
+                w.user.user
+            ),
+        }
+    ),
+}
+
+
+def send(world, endpoint):
+    client, method, url, data = CASES[endpoint](world)
+    return getattr(client, method)(url, data, format='json')
+
+
+@pytest.fixture
+def budgets(settings):
+    settings.QUERY_LOG = True
+    settings.QUERY_BUDGETS_STRICT = True
+    return settings
+
+
+@pytest.fixture
+def world(budgets):
+    return World()
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+
+    def test_cases_cover_budgets(self):
+        assert set(CASES) == set(django_settings.QUERY_BUDGETS), (
+            'Проверьте, что для каждого бюджета в QUERY_BUDGETS есть '
+            'запрос в тесте'
+        )
+
+    @pytest.mark.parametrize('warm', [False, True], ids=['cold', 'warm'])
+    @pytest.mark.parametrize('endpoint', sorted(CASES))
+    def test_within_budget(self, budgets, world, endpoint, warm):
+        if warm:
+            budgets.QUERY_BUDGETS_STRICT = False
+            send(world, endpoint)
+            budgets.QUERY_BUDGETS_STRICT = True
+
+        response = send(world, endpoint)
+
+        assert response.status_code < 400, (
+            '{} ответил {}: {}'.format(
+                endpoint, response.status_code, response.content
+            )
+        )
+
+    def test_over_budget_raises(self, budgets, world):
+        budgets.QUERY_BUDGETS = {'TitleViewSet.list': 0}
+
+        with pytest.raises(QueryBudgetError):
+            send(world, 'TitleViewSet.list')
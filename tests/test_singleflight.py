@@ -0,0 +1,114 @@
+from threading import Event, Thread
+
+import pytest
+from api.views import SingleFlightMixin
+from core import singleflight
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from reviews.models import Title
+
+
+class JoinedFlight(singleflight.SingleFlight):
+    """SingleFlight, который сообщает, что ведомый вызов начал ждать."""
+
+    def __init__(self):
+        super().__init__()
+        self.joined = Event()
+
+    def wait(self, call, func):
+        self.joined.set()
+        return super().wait(call, func)
+
+
+class TestSingleFlight:
+
+    def test_concurrent_callers_share_result(self, settings, monkeypatch):
+        settings.SINGLE_FLIGHT_SHARED = False
+        group = JoinedFlight()
+        monkeypatch.setattr(singleflight, 'group', group)
+        calls = []
+        started = Event()
+
+        def load():
+            calls.append(1)
+            started.set()
+            # Ведущий держит вычисление, пока ведомый не встанет в ожидание.
+            assert group.joined.wait(5)
+            return {'status': 200, 'data': ['title']}
+
+        results = [None, None]
+
+        def request(index):
+            results[index] = singleflight.single_flight('titles', load)
+
+        leader = Thread(target=request, args=(0,))
+        leader.start()
+        assert started.wait(5)
+        follower = Thread(target=request, args=(1,))
+        follower.start()
+        leader.join(5)
+        follower.join(5)
+
+        assert len(calls) == 1, (
+            'Проверьте, что одновременные вызовы с одним ключом выполняют '
+            'функцию один раз'
+        )
+        assert results[0] is results[1], (
+            'Проверьте, что ведомый вызов получает результат ведущего'
+        )
+        assert results[0] == {'status': 200, 'data': ['title']}
+
+
+# Потоки работают со своими соединениями, поэтому данные должны быть
+# зафиксированы.
+@pytest.mark.django_db(transaction=True)
+class TestTitleRetrieveSingleFlight:
+
+    def test_concurrent_retrieves_load_once(self, settings, monkeypatch):
+        settings.SINGLE_FLIGHT_SHARED = False
+        group = JoinedFlight()
+        monkeypatch.setattr(singleflight, 'group', group)
+        parts = SingleFlightMixin.response_parts
+        started = Event()
+
+        def response_parts(response):
+            # Ведущий держит вычисление, пока ведомый не встанет в ожидание.
+            started.set()
+            assert group.joined.wait(5)
+            return parts(response)
+
+        monkeypatch.setattr(
+            SingleFlightMixin, 'response_parts', staticmethod(response_parts)
+        )
+        title = Title.objects.create(name='Фильм', year=2000)
+        url = '/api/v1/titles/{}/'.format(title.pk)
+        responses = [None, None]
+        loads = [None, None]
+
+        def request(index):
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    responses[index] = Client().get(url)
+                loads[index] = sum(
+                    'FROM "reviews_title"' in query['sql']
+                    for query in queries.captured_queries
+                )
+            finally:
+                connection.close()
+
+        leader = Thread(target=request, args=(0,))
+        leader.start()
+        assert started.wait(5)
+        follower = Thread(target=request, args=(1,))
+        follower.start()
+        leader.join(5)
+        follower.join(5)
+
+        assert loads == [1, 0], (
+            'Проверьте, что одновременные retrieve одного произведения '
+            'читают его из базы один раз'
+        )
+        assert [response.status_code for response in responses] == [200, 200]
+        assert responses[0].json() == responses[1].json()
+        assert responses[1].json()['name'] == 'Фильм'
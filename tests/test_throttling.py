@@ -0,0 +1,103 @@
+from collections import OrderedDict
+
+import pytest
+from api import throttling
+from django.core.cache import cache
+
+
+class ClockThrottle(throttling.TokenBucketThrottle):
+    """Корзина 3 запроса в минуту с управляемыми часами."""
+
+    scope = 'test'
+    now = 1000.0
+
+    def get_rate(self):
+        return '3/min'
+
+    def timer(self):
+        return ClockThrottle.now
+
+    def get_idents(self, request, view):
+        return request
+
+
+def allow(*idents):
+    return ClockThrottle().allow_request(list(idents), None)
+
+
+@pytest.fixture(autouse=True)
+def clean_buckets(monkeypatch):
+    cache.clear()
+    monkeypatch.setattr(throttling, '_local_buckets', OrderedDict())
+    ClockThrottle.now = 1000.0
+    yield
+    cache.clear()
+
+
+def bucket(ident):
+    return cache.get('throttle_test_{}'.format(ident))
+
+
+class TestTokenBucketThrottle:
+
+    def test_denies_when_empty(self):
+        assert [allow('ip') for _ in range(4)] == [True, True, True, False]
+        throttle = ClockThrottle()
+        assert not throttle.allow_request(['ip'], None)
+        assert throttle.wait() == pytest.approx(20), (
+            'Проверьте, что wait() возвращает время до появления токена'
+        )
+
+    def test_refill(self):
+        for _ in range(3):
+            allow('ip')
+        ClockThrottle.now += 20
+        assert allow('ip'), (
+            'Проверьте, что за duration / num_requests секунд появляется '
+            'токен'
+        )
+        assert not allow('ip')
+        ClockThrottle.now += 600
+        assert [allow('ip') for _ in range(4)] == [True, True, True, False], (
+            'Проверьте, что корзина не наполняется сверх лимита'
+        )
+
+    def test_all_or_nothing(self):
+        for _ in range(3):
+            allow('empty')
+
+        assert not allow('full', 'empty')
+        assert bucket('full') is None, (
+            'Проверьте, что отказ одной корзины не списывает токены других'
+        )
+        assert allow('full', 'other')
+        assert bucket('full')[0] == pytest.approx(2)
+        assert bucket('other')[0] == pytest.approx(2)
+
+    def test_busy_lock_uses_local_bucket(self):
+        cache.add(throttling.LOCK_KEY.format('throttle_test_ip'), 1)
+
+        assert allow('ip'), (
+            'Проверьте, что занятая блокировка не приводит к отказу'
+        )
+        assert bucket('ip') is None
+        assert throttling._local_buckets['throttle_test_ip'][0] == (
+            pytest.approx(2)
+        )
+
+    def test_cache_error_uses_local_bucket(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise ConnectionError
+
+        monkeypatch.setattr(ClockThrottle.cache, 'add', fail)
+
+        assert [allow('ip') for _ in range(4)] == [True, True, True, False]
+
+    def test_other_errors_are_raised(self, monkeypatch):
+        def fail(*args, **kwargs):
+            raise TypeError
+
+        monkeypatch.setattr(ClockThrottle.cache, 'add', fail)
+
+        with pytest.raises(TypeError):
+            allow('ip')
@@ -0,0 +1,46 @@
+import pytest
+from reviews.models import Category, Genre, Title
+
+
+@pytest.fixture
+def titles():
+    category = Category.objects.create(name='Фильм', slug='film')
+    drama = Genre.objects.create(name='Драма', slug='drama')
+    horror = Genre.objects.create(name='Ужасы', slug='horror')
+    both = Title.objects.create(name='Оба', year=1995, category=category)
+    both.genre.set([drama, horror])
+    one = Title.objects.create(name='Один', year=2001, category=category)
+    one.genre.set([drama])
+    return [both, one]
+
+
+@pytest.mark.django_db
+class TestGenreFilter:
+    # Подстрока r входит в slug обоих жанров.
+    params = {'genre': 'r'}
+
+    def test_list_has_no_duplicates(self, client, titles):
+        response = client.get(
+            '/api/v1/titles/', dict(self.params, fields='id', page_size=10)
+        )
+
+        data = response.json()
+        ids = [item['id'] for item in data['results']]
+        assert sorted(ids) == sorted(title.pk for title in titles), (
+            'Проверьте, что произведение с несколькими подходящими жанрами '
+            'попадает в список один раз'
+        )
+        assert data['count'] == len(titles)
+
+    def test_facets_count_titles_once(self, client, titles):
+        response = client.get('/api/v1/titles/facets/', self.params)
+
+        data = response.json()
+        assert data['count'] == len(titles), (
+            'Проверьте, что фасеты считают произведение один раз'
+        )
+        assert data['categories'][0]['count'] == len(titles)
+        assert sum(year['count'] for year in data['years']) == len(titles)
+        assert {genre['slug']: genre['count'] for genre in data['genres']} == {
+            'drama': 2, 'horror': 1
+        }